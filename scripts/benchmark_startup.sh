@@ -0,0 +1,31 @@
+#!/bin/bash
+# Measures how long the importer takes to start up for a JSON import.
+#
+# Runs `--help` (module import plus argument parsing) several times and prints the
+# fastest wall time, then lists the slowest imports reported by `python -X importtime`.
+#
+# Usage:
+#   ./benchmark_startup.sh [RUNS]
+#
+# Example:
+#   ./benchmark_startup.sh 10
+
+RUNS=${1:-5}
+SCRIPT_DIR=$(cd "$(dirname "$0")" && pwd)
+IMPORTER="$SCRIPT_DIR/../src/spoolman_importer.py"
+
+BEST=""
+for _ in $(seq "$RUNS"); do
+  START=$(date +%s%N)
+  python "$IMPORTER" --help > /dev/null
+  END=$(date +%s%N)
+  ELAPSED=$(( (END - START) / 1000000 ))
+  if [ -z "$BEST" ] || [ "$ELAPSED" -lt "$BEST" ]; then
+    BEST=$ELAPSED
+  fi
+done
+echo "Fastest startup over $RUNS runs: ${BEST} ms"
+
+echo
+echo "Slowest imports (cumulative microseconds):"
+python -X importtime "$IMPORTER" --help 2>&1 > /dev/null | sort -t '|' -k2 -n -r | head -n 10
@@ -4,25 +4,982 @@ Spoolman Receipt Importer
 Extracts filament data from PDF receipts and imports to Spoolman via API
 """
 
+import abc
 import argparse
+import functools
+import glob
+import hashlib
 import json
+import os
+import pickle
+import random
 import re
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from pypdf import PdfReader
 import requests
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+
+# pypdf, openai and asyncio are imported on first use so JSON imports start quickly
+if TYPE_CHECKING:
+    import asyncio
+
+
+DEFAULT_HTTP_TIMEOUT = 30.0
+DEFAULT_HTTP_POOL_SIZE = 10
+
+# Spoolman writes failing with these statuses, a timeout or a dropped connection are retried
+DEFAULT_WRITE_RETRIES = 3
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+# A write slower than this multiple of the smoothed write latency counts as a congestion signal
+LATENCY_TOLERANCE = 2.0
+# Latencies below this are treated as equal, so jitter on fast local servers is not mistaken for congestion
+MIN_LATENCY_BASELINE = 0.05
+
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+# JSON inputs with these suffixes are newline-delimited and always streamed
+STREAMING_JSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+DEFAULT_CACHE_DIR = Path(os.getenv('XDG_CACHE_HOME') or Path.home() / '.cache') / 'spoolman-importer'
+DEFAULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+LLM_MODEL = "gpt-4"
+# Bump whenever the extraction prompt changes so cached LLM results are invalidated
+LLM_PROMPT_VERSION = "1"
+# Longer receipts are split at line-item boundaries and the chunks extracted concurrently
+LLM_CHUNK_MAX_CHARS = 6000
+DEFAULT_LLM_CONCURRENCY = 4
+DEFAULT_LLM_TIMEOUT = 120.0
+# A receipt line ending in a price closes a line item, so it is a safe place to split
+PRICE_LINE_PATTERN = re.compile(r'(?:\d[\d.,]*\s*(?:€|EUR|USD|\$|£)|(?:€|EUR|USD|\$|£)\s*\d[\d.,]*)\s*$',
+                                re.IGNORECASE)
+
+RESOURCES_DIR = Path(__file__).parent / "resources"
+DEFAULT_COMPILED_DB_PATH = RESOURCES_DIR / "vendor-data.pickle"
+DEFAULT_CATALOG_PATH = RESOURCES_DIR / "vendor-catalog.sqlite"
+# Bump whenever the layout of the compiled database or its compiled matchers change
+COMPILED_DB_VERSION = 2
+
+# Base material families in matching priority; vendor-data.json material_defaults can add more
+BASE_MATERIAL_FAMILIES = ["PLA", "PETG", "ABS", "ASA", "TPU", "WOOD", "SILK"]
+
+# Page size (limit) for paginated Spoolman queries and incremental mirror syncs
+API_PAGE_SIZE = 500
+
+# Matches the "ImportID: [...]" tag that build_comment() appends to spool comments.
+# Anchored on the ID's own structure because filenames and colors in it may contain ']',
+# and users may add notes after the tag in Spoolman.
+IMPORT_ID_PATTERN = re.compile(r'ImportID: \[(imported_from:.*?\|index:\d+)\]')
+
+
+class Timings:
+    """
+    Thread-safe latency recorder for import stages and Spoolman HTTP calls.
+
+    Stages are measured with ``measure(name)`` or the ``timed`` method decorator, which
+    only records when the owning object's ``timings`` attribute is set. ``summary()``
+    reports per-stage counts, totals and nearest-rank p50/p95/p99 latencies in seconds.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        summary = {}
+        for stage, values in sorted(samples.items()):
+            stats = {"count": len(values), "total": sum(values)}
+            for percentile in self.PERCENTILES:
+                rank = max(1, -(-percentile * len(values) // 100))
+                stats[f"p{percentile}"] = values[rank - 1]
+            summary[stage] = stats
+        return summary
+
+    def format_table(self) -> str:
+        """Render the summary as a fixed-width table with latencies in milliseconds."""
+        summary = self.summary()
+        width = max([len("stage")] + [len(stage) for stage in summary])
+        columns = ["count", "total ms"] + [f"p{p} ms" for p in self.PERCENTILES]
+        lines = [f"{'stage':<{width}}  " + "  ".join(f"{column:>10}" for column in columns)]
+        for stage, stats in summary.items():
+            values = [f"{stats['count']:>10}", f"{stats['total'] * 1000:>10.1f}"]
+            values += [f"{stats[f'p{p}'] * 1000:>10.1f}" for p in self.PERCENTILES]
+            lines.append(f"{stage:<{width}}  " + "  ".join(values))
+        return "\n".join(lines)
+
+
+def timed(stage: str):
+    """Record the duration of a method under stage in self.timings, when timings are enabled."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.timings is None:
+                return method(self, *args, **kwargs)
+            with self.timings.measure(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SpoolmanClient:
+    """Keep-alive HTTP client for the Spoolman API.
+
+    All requests share one pooled ``requests.Session`` so that a large import
+    reuses a handful of sockets instead of opening a connection per call.
+    """
+
+    def __init__(self, base_url: str, timeout: float = DEFAULT_HTTP_TIMEOUT,
+                 pool_size: int = DEFAULT_HTTP_POOL_SIZE, timings: Optional[Timings] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        # Optional recorder of per-endpoint request latencies
+        self.timings = timings
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path: str) -> str:
+        """Build an absolute URL for an API path such as '/api/v1/vendor'."""
+        return f"{self.base_url}{path}"
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self._request('get', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self._request('post', path, **kwargs)
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        send = getattr(self.session, method)
+        if self.timings is None:
+            return send(self.url(path), **kwargs)
+        with self.timings.measure(f"http {method.upper()} {path}"):
+            return send(self.url(path), **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on concurrent Spoolman writes.
+
+    Each fast write adds 1/limit slots, so the limit grows by about one slot per
+    round of requests (additive increase). A write that fails transiently or is slower
+    than LATENCY_TOLERANCE times the smoothed latency halves the limit (multiplicative
+    decrease), at most once per smoothed latency interval. Callers block in acquire()
+    while the limit is reached.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        # Exponentially weighted moving average of successful write latency, in seconds
+        self.latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Wait for a free slot and return the start time to pass to release()."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, overloaded: bool = False):
+        """Free a slot and adapt the limit to the request's latency and outcome."""
+        now = time.monotonic()
+        elapsed = now - started
+        with self._condition:
+            self.in_flight -= 1
+            slow = self.latency is not None and elapsed > max(self.latency, MIN_LATENCY_BASELINE) * LATENCY_TOLERANCE
+            if not overloaded:
+                self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+            if overloaded or slow:
+                if now - self._last_decrease >= (self.latency or 0.0):
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether a failed Spoolman request is worth retrying."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    return (isinstance(error, requests.exceptions.HTTPError) and error.response is not None
+            and error.response.status_code in TRANSIENT_HTTP_STATUSES)
+
+
+def retry_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff before retry number attempt (1-based), honoring Retry-After."""
+    delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+    retry_after = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return max(delay, min(RETRY_BACKOFF_MAX, float(retry_after.get('Retry-After', 0))))
+    except (TypeError, ValueError):
+        return delay
+
+
+class DiskCache:
+    """
+    Small content-addressed on-disk cache with a size cap and LRU eviction.
+
+    Each entry is one file named after its key. Reads refresh the file's mtime, and when
+    the directory grows past ``max_bytes`` the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the given parts into a cache key."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.cache"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            value = path.read_text(encoding='utf-8')
+            os.utime(path)
+            return value
+        except OSError:
+            return None
+
+    def set(self, key: str, value: str):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(key).with_suffix('.tmp')
+            tmp_path.write_text(value, encoding='utf-8')
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except OSError as e:
+            print(f"Warning: Could not write cache entry in {self.directory}: {e}")
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob('*.cache'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob('*.cache'):
+            path.unlink(missing_ok=True)
+
+
+class VendorCatalog:
+    """
+    SQLite-backed vendor, material and color catalog.
+
+    An alternative to holding vendor-data.json and color-data.json in memory: brands and
+    materials are looked up through case-insensitive indexes, partial material matches use
+    an FTS5 trigram index where SQLite supports it, and only the small material defaults and
+    aliases tables are loaded into Python.
+    """
+
+    SCHEMA = """
+        CREATE TABLE vendors (id INTEGER PRIMARY KEY, name TEXT NOT NULL, name_lower TEXT NOT NULL);
+        CREATE INDEX vendors_name_lower ON vendors (name_lower, id);
+        CREATE TABLE materials (id INTEGER PRIMARY KEY, vendor_id INTEGER NOT NULL REFERENCES vendors (id),
+                                material TEXT NOT NULL, material_lower TEXT NOT NULL, data TEXT NOT NULL);
+        CREATE INDEX materials_vendor_material ON materials (vendor_id, material_lower, id);
+        CREATE TABLE material_defaults (name TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL);
+        CREATE TABLE material_aliases (alias TEXT PRIMARY KEY, position INTEGER NOT NULL, family TEXT NOT NULL);
+        CREATE TABLE colors (keyword TEXT PRIMARY KEY, position INTEGER NOT NULL, hex TEXT);
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.has_fts = bool(self._query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'materials_fts'"))
+
+    @classmethod
+    def build(cls, path: Path, vendor_data: Dict, color_data: Dict) -> 'VendorCatalog':
+        """Create (or replace) a catalog database from vendor and color data."""
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.unlink(missing_ok=True)
+        connection = sqlite3.connect(str(tmp_path))
+        with connection:
+            connection.executescript(cls.SCHEMA)
+            try:
+                connection.execute("CREATE VIRTUAL TABLE materials_fts USING fts5("
+                                   "material_lower, content='materials', content_rowid='id', tokenize='trigram')")
+            except sqlite3.OperationalError:
+                pass  # SQLite without FTS5 trigram support; partial matches fall back to instr()
+            for vendor_name, vendor_materials in vendor_data.get("vendors", {}).items():
+                vendor_id = connection.execute("INSERT INTO vendors (name, name_lower) VALUES (?, ?)",
+                                               (vendor_name, vendor_name.lower())).lastrowid
+                connection.executemany(
+                    "INSERT INTO materials (vendor_id, material, material_lower, data) VALUES (?, ?, ?, ?)",
+                    [(vendor_id, material, material.lower(), json.dumps(data))
+                     for material, data in vendor_materials.items()])
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'materials_fts'").fetchone():
+                connection.execute("INSERT INTO materials_fts (materials_fts) VALUES ('rebuild')")
+            connection.executemany(
+                "INSERT INTO material_defaults (name, position, data) VALUES (?, ?, ?)",
+                [(name, position, json.dumps(data))
+                 for position, (name, data) in enumerate(vendor_data.get("material_defaults", {}).items())])
+            connection.executemany(
+                "INSERT INTO material_aliases (alias, position, family) VALUES (?, ?, ?)",
+                [(alias, position, family)
+                 for position, (alias, family) in enumerate(vendor_data.get("material_aliases", {}).items())])
+            connection.executemany(
+                "INSERT INTO colors (keyword, position, hex) VALUES (?, ?, ?)",
+                [(keyword, position, hex_code)
+                 for position, (keyword, hex_code) in enumerate(color_data.get("colors", {}).items())])
+        connection.close()
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def load_vendor_defaults(self) -> Dict:
+        """Return vendor data holding only material defaults and aliases; vendors stay in SQLite."""
+        return {
+            "vendors": {},
+            "material_defaults": {name: json.loads(data) for name, data in self._query(
+                "SELECT name, data FROM material_defaults ORDER BY position")},
+            "material_aliases": dict(self._query("SELECT alias, family FROM material_aliases ORDER BY position")),
+        }
+
+    def vendor_names(self) -> List[str]:
+        return [name for name, in self._query("SELECT name FROM vendors ORDER BY id")]
+
+    def find_vendor_material(self, brand_normalized: str, material_normalized: str) -> Optional[Dict]:
+        """
+        Find a vendor's material entry, with the same order as the in-memory lookup:
+        vendors with the brand in file order, exact material before partial matches.
+        """
+        material_lower = material_normalized.lower()
+        for vendor_id, in self._query("SELECT id FROM vendors WHERE name_lower = ? ORDER BY id",
+                                      (brand_normalized,)):
+            rows = self._query("SELECT data FROM materials WHERE vendor_id = ? AND material_lower = ? "
+                               "ORDER BY id LIMIT 1", (vendor_id, material_lower))
+            if not rows and self.has_fts and len(material_lower) >= 3:
+                # Trigram MATCH narrows candidates to rows containing the query as a substring
+                rows = self._query(
+                    "SELECT m.data FROM materials_fts JOIN materials m ON m.id = materials_fts.rowid "
+                    "WHERE materials_fts MATCH ? AND m.vendor_id = ? AND instr(m.material_lower, ?) > 0 "
+                    "ORDER BY m.id LIMIT 1",
+                    ('"{}"'.format(material_lower.replace('"', '""')), vendor_id, material_lower))
+            elif not rows:
+                rows = self._query("SELECT data FROM materials WHERE vendor_id = ? AND instr(material_lower, ?) > 0 "
+                                   "ORDER BY id LIMIT 1", (vendor_id, material_lower))
+            if rows:
+                data = json.loads(rows[0][0])
+                if data:
+                    return data
+        return None
+
+    def find_color(self, normalized_color_name: str) -> Optional[str]:
+        """Return the hex code for an exact color keyword, else for the longest keyword in the name."""
+        rows = self._query("SELECT hex FROM colors WHERE keyword = ?", (normalized_color_name,))
+        if not rows:
+            rows = self._query("SELECT hex FROM colors WHERE instr(?, keyword) > 0 "
+                               "ORDER BY length(keyword) DESC, position LIMIT 1", (normalized_color_name,))
+        return rows[0][0] if rows else None
+
+    def close(self):
+        self.connection.close()
+
+
+class SpoolmanMirror:
+    """
+    Persistent SQLite snapshot of Spoolman vendors, filaments and spools.
+
+    Each collection is synced at most once per run. Syncs are incremental: records are
+    requested newest first (``sort=id:desc``) a page at a time until an id at or below the
+    stored high-water mark turns up, so a sync of an unchanged instance costs one small
+    request per collection. When the server's ``X-Total-Count`` disagrees with the local
+    row count afterwards (records were deleted), the collection is downloaded in full.
+    Records edited in place on the server are only picked up by a full refresh.
+    """
+
+    COLLECTIONS = ('vendor', 'filament', 'spool')
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS records (collection TEXT NOT NULL, id INTEGER NOT NULL, data TEXT NOT NULL,
+                                            PRIMARY KEY (collection, id));
+    """
+
+    def __init__(self, path: Path, spoolman_url: str, page_size: int = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.page_size = page_size or API_PAGE_SIZE
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._synced: Set[str] = set()
+        with self._lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'spoolman_url'").fetchone()
+            if row is None or row[0] != spoolman_url:
+                # A snapshot of another Spoolman instance is useless here
+                self.connection.execute("DELETE FROM records")
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('spoolman_url', ?)",
+                                        (spoolman_url,))
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _store(self, collection: str, records: List[Dict], replace: bool = False):
+        with self._lock, self.connection:
+            if replace:
+                self.connection.execute("DELETE FROM records WHERE collection = ?", (collection,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, data) VALUES (?, ?, ?)",
+                [(collection, record['id'], json.dumps(record)) for record in records])
+
+    def clear(self):
+        """Drop all records so the next sync downloads every collection in full."""
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM records")
+        self._synced.clear()
+
+    def records(self, collection: str) -> List[Dict]:
+        """Return the mirrored records of a collection in id order."""
+        return [json.loads(data) for data, in self._query(
+            "SELECT data FROM records WHERE collection = ? ORDER BY id", (collection,))]
+
+    def sync(self, api: SpoolmanClient, collection: str) -> List[Dict]:
+        """Bring a collection up to date (once per run) and return its records. Raises on HTTP errors."""
+        if collection not in self._synced:
+            self._sync(api, collection)
+            self._synced.add(collection)
+        return self.records(collection)
+
+    def _sync(self, api: SpoolmanClient, collection: str):
+        path = f"/api/v1/{collection}"
+        (high_water_mark, count), = self._query(
+            "SELECT MAX(id), COUNT(*) FROM records WHERE collection = ?", (collection,))
+        if high_water_mark is None:
+            self._full_sync(api, collection)
+            return
+
+        fresh, offset, total = [], 0, None
+        while True:
+            response = api.get(path, params={"sort": "id:desc", "limit": self.page_size, "offset": offset})
+            response.raise_for_status()
+            page = response.json()
+            if len(page) > self.page_size:
+                # The server ignored the paging parameters and sent everything
+                self._store(collection, page, replace=True)
+                return
+            total = response.headers.get('X-Total-Count')
+            new = [record for record in page if record['id'] > high_water_mark]
+            fresh.extend(new)
+            if len(new) < len(page) or len(page) < self.page_size:
+                break
+            offset += self.page_size
+
+        self._store(collection, fresh)
+        if total is not None and int(total) != count + len(fresh):
+            print(f"Local {collection} mirror is out of date, downloading all {total} records")
+            self._full_sync(api, collection)
+
+    def _full_sync(self, api: SpoolmanClient, collection: str):
+        response = api.get(f"/api/v1/{collection}")
+        response.raise_for_status()
+        self._store(collection, response.json(), replace=True)
+
+    def close(self):
+        self.connection.close()
+
+
+class ImportJournal:
+    """
+    Append-only JSON-lines journal of imported spools, used to resume interrupted imports.
+
+    Each spool of a receipt line gets one entry once it exists in Spoolman:
+    {"source": ..., "import_id": ..., "filament_id": ..., "spool_id": ...}, where spool_id
+    is null for spools that were already there. A {"source": ..., "complete": true} entry
+    marks a receipt whose lines were all imported. The source identifies the Spoolman
+    instance and the receipt file by path and contents (see SpoolmanImporter.journal_source),
+    so entries never match another server or a different file with the same name.
+    Entries are flushed as they are written, so a crashed run loses at most the entry
+    being written. compact() rewrites the file without duplicates and folds completed
+    receipts into their marker.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+        # Loaded on first lookup; record() keeps them current afterwards
+        self._import_ids: Optional[Dict[Tuple[str, str], Dict]] = None
+        self._complete_sources: Set[str] = set()
+
+    def _read_entries(self) -> List[Dict]:
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # Torn last line of a crashed run
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _load(self):
+        if self._import_ids is None:
+            self._import_ids = {}
+            for entry in self._read_entries():
+                if entry.get('complete'):
+                    self._complete_sources.add(entry['source'])
+                elif 'import_id' in entry:
+                    self._import_ids[(entry.get('source'), entry['import_id'])] = entry
+
+    def _append(self, entry: Dict):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def is_complete(self, source: str, import_ids: List[str]) -> bool:
+        """Whether the receipt was completed or all of the given ImportIDs were imported."""
+        with self._lock:
+            self._load()
+            return source in self._complete_sources or all((source, i) in self._import_ids for i in import_ids)
+
+    def record(self, source: str, import_id: str, filament_id: int, spool_id: Optional[int] = None):
+        entry = {"source": source, "import_id": import_id, "filament_id": filament_id, "spool_id": spool_id}
+        with self._lock:
+            self._append(entry)
+            if self._import_ids is not None:
+                self._import_ids[(source, import_id)] = entry
+
+    def mark_complete(self, source: str):
+        with self._lock:
+            self._append({"source": source, "complete": True})
+            self._complete_sources.add(source)
+
+    def compact(self) -> Tuple[int, int]:
+        """Rewrite the journal with one entry per ImportID and one marker per completed receipt.
+        Returns the entry counts before and after, (0, 0) if there is no journal yet."""
+        with self._lock:
+            self.close()
+            if not self.path.exists():
+                return 0, 0
+            entries = self._read_entries()
+            complete = {entry['source'] for entry in entries if entry.get('complete')}
+            kept = {}
+            for entry in entries:
+                if entry.get('complete'):
+                    kept[('complete', entry['source'])] = entry
+                elif 'import_id' in entry and entry.get('source') not in complete:
+                    kept[('spool', entry.get('source'), entry['import_id'])] = entry
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.writelines(json.dumps(entry) + "\n" for entry in kept.values())
+            os.replace(tmp_path, self.path)
+            self._import_ids, self._complete_sources = None, set()
+            return len(entries), len(kept)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _read_pdf_text(pdf_path: str) -> str:
+    """Parse a PDF file and return its text content."""
+    from pypdf import PdfReader
+
+    try:
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PdfReader(file)
+            text = ""
+            for page in pdf_reader.pages:
+                text += page.extract_text() + "\n"
+            return text
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
+        return ""
+
+
+def extract_pdf_text(pdf_path: str, cache: Optional[DiskCache] = None) -> str:
+    """
+    Extract text content from PDF file, reusing cached text when the file is unchanged.
+
+    Cached text is keyed by a hash of the file contents. A stat entry per path records
+    mtime, size and content hash, so unchanged files are not even re-read. Module-level
+    so it can run in a process pool.
+    """
+    if cache is None:
+        return _read_pdf_text(pdf_path)
+
+    try:
+        stat = os.stat(pdf_path)
+        stat_key = DiskCache.make_key('pdf-stat', os.path.abspath(pdf_path))
+        fingerprint = f"{stat.st_mtime_ns} {stat.st_size}"
+        content_hash = None
+        stat_entry = cache.get(stat_key)
+        if stat_entry and stat_entry.rsplit(' ', 1)[0] == fingerprint:
+            content_hash = stat_entry.rsplit(' ', 1)[1]
+        else:
+            with open(pdf_path, 'rb') as file:
+                content_hash = hashlib.sha256(file.read()).hexdigest()
+            cache.set(stat_key, f"{fingerprint} {content_hash}")
+    except OSError:
+        return _read_pdf_text(pdf_path)
+
+    text_key = DiskCache.make_key('pdf-text', content_hash)
+    text = cache.get(text_key)
+    if text is None:
+        text = _read_pdf_text(pdf_path)
+        if text:
+            cache.set(text_key, text)
+    return text
+
+
+def split_receipt_text(text: str, max_chars: int = None) -> List[str]:
+    """
+    Split receipt text into chunks of at most max_chars, breaking only at line-item
+    boundaries (blank lines or lines ending in a price) where possible.
+    """
+    max_chars = max_chars or LLM_CHUNK_MAX_CHARS
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks, current, size, boundary = [], [], 0, 0
+    for line in text.splitlines(keepends=True):
+        if current and size + len(line) > max_chars:
+            # Cut after the last line-item boundary, or here if the chunk has none
+            cut = boundary or len(current)
+            chunks.append(''.join(current[:cut]))
+            current = current[cut:]
+            size, boundary = sum(len(kept) for kept in current), 0
+        current.append(line)
+        size += len(line)
+        if not line.strip() or PRICE_LINE_PATTERN.search(line):
+            boundary = len(current)
+    if current:
+        chunks.append(''.join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+# Prompt sent to LLM extraction backends; bump LLM_PROMPT_VERSION when changing it
+EXTRACTION_PROMPT = """
+Extract 3D printer filament information from this receipt text. 
+Return ONLY a JSON array of filament objects. Each object should have:
+- brand: string (manufacturer name)
+- material: string (PLA, PETG, ABS, etc.)
+- color: string 
+- diameter: number (1.75 or 3.0, default 1.75)
+- weight: number (filament weight in grams, e.g. 1000 for 1kg)
+- price: number (unit price)
+- quantity: number (how many spools)
+- spool_weight: number (optional, empty spool weight in grams, e.g. 200-250 for typical spools)
+
+Only include items that are clearly 3D printer filaments. Ignore other products.
+If information is missing, use reasonable defaults or null.
+For spool_weight, only include if you can determine it from the receipt (rare), otherwise omit.
+
+Receipt text:
+{receipt_text}
+
+JSON array:
+"""
+
+
+class ExtractionBackend(abc.ABC):
+    """Turns receipt text into raw filament dicts.
+
+    ``extract`` returns None when the extraction itself failed, so callers can
+    tell a failure apart from a receipt without filaments. Remote backends are
+    cached on disk and fed long receipts in chunks, up to ``concurrency`` at once.
+    """
+
+    name = "base"
+    remote = True
+
+    def __init__(self, model: str = LLM_MODEL, timeout: float = DEFAULT_LLM_TIMEOUT,
+                 concurrency: int = DEFAULT_LLM_CONCURRENCY):
+        self.model = model
+        self.timeout = timeout
+        self.concurrency = max(1, concurrency)
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is configured well enough to be called."""
+        return True
+
+    def cache_key_parts(self) -> Tuple:
+        """Values that, with the prompt version and receipt text, identify a cached result."""
+        return self.name, self.model
+
+    @abc.abstractmethod
+    def extract(self, receipt_text: str) -> Optional[List[Dict]]:
+        """Return the filaments found in the receipt text, or None if extraction failed."""
+
+
+class OpenAIBackend(ExtractionBackend):
+    """Chat-completions extraction through the OpenAI API."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str = None, model: str = LLM_MODEL, timeout: float = DEFAULT_LLM_TIMEOUT,
+                 concurrency: int = DEFAULT_LLM_CONCURRENCY, base_url: str = None):
+        super().__init__(model=model, timeout=timeout, concurrency=concurrency)
+        self.api_key = api_key
+        self.base_url = base_url
+        # Built on first use so JSON imports never load the openai package
+        self._client = None
+        self._client_built = False
+
+    @property
+    def client(self):
+        """OpenAI client, created on first access if the backend is configured."""
+        if not self._client_built and self.api_key:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+            self._client_built = True
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        # An assigned client is kept as is; assigning None disables the LLM
+        self._client = client
+        self._client_built = True
+
+    @property
+    def available(self) -> bool:
+        return self.client is not None
+
+    def cache_key_parts(self) -> Tuple:
+        # Same key layout as before backends existed, so cached OpenAI results stay valid
+        return (self.model,)
+
+    def extract(self, receipt_text: str) -> Optional[List[Dict]]:
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a data extraction assistant. Return only valid JSON."},
+                    {"role": "user", "content": EXTRACTION_PROMPT.format(receipt_text=receipt_text)}
+                ],
+                temperature=0.1
+            )
+
+            result = response.choices[0].message.content.strip()
+            # Clean up response - remove markdown formatting if present
+            if result.startswith('```json'):
+                result = result.replace('```json', '').replace('```', '')
+
+            filaments = json.loads(result)
+            if not isinstance(filaments, list):
+                raise ValueError(f"expected a JSON array, got {type(filaments).__name__}")
+            return filaments
+
+        except Exception as e:
+            print(f"LLM extraction error: {e}")
+            return None
+
+
+class OpenAICompatibleBackend(OpenAIBackend):
+    """A local or self-hosted server speaking the OpenAI chat API (Ollama, llama.cpp, vLLM, ...)."""
+
+    name = "local"
+
+    def __init__(self, api_key: str = None, model: str = LLM_MODEL, timeout: float = DEFAULT_LLM_TIMEOUT,
+                 concurrency: int = DEFAULT_LLM_CONCURRENCY, base_url: str = None):
+        # Local servers usually ignore the key, but the client requires one
+        super().__init__(api_key=api_key or "local", model=model, timeout=timeout,
+                         concurrency=concurrency, base_url=base_url)
+
+    @property
+    def available(self) -> bool:
+        return bool(self.base_url) and self.client is not None
+
+    def cache_key_parts(self) -> Tuple:
+        return self.name, self.base_url, self.model
+
+
+class RuleBasedBackend(ExtractionBackend):
+    """Deterministic offline extraction with regular expressions; no network, no cache."""
+
+    name = "rules"
+    remote = False
+
+    def __init__(self, model: str = "patterns", timeout: float = DEFAULT_LLM_TIMEOUT,
+                 concurrency: int = DEFAULT_LLM_CONCURRENCY):
+        super().__init__(model=model, timeout=timeout, concurrency=concurrency)
+
+    def extract(self, receipt_text: str) -> Optional[List[Dict]]:
+        filaments = []
+
+        # Common filament patterns
+        patterns = [
+            r'(?i)(PLA|ABS|PETG|TPU|WOOD|SILK)\s+.*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)',
+            r'(?i)filament.*?(PLA|ABS|PETG|TPU).*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)',
+            r'(?i)(1\.75|3\.0).*?(PLA|ABS|PETG|TPU).*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)'
+        ]
+
+        for pattern in patterns:
+            matches = re.findall(pattern, receipt_text)
+            for match in matches:
+                if len(match) >= 2:
+                    filament = {
+                        'brand': 'Unknown',
+                        'material': match[0].upper() if match[0] else 'PLA',
+                        'color': 'Unknown',
+                        'diameter': 1.75,
+                        'weight': 1000,  # Default 1kg
+                        'price': float(match[-1]),
+                        'quantity': 1
+                    }
+                    filaments.append(filament)
+
+        return filaments
+
+
+# Backends selectable with --llm-backend
+EXTRACTION_BACKENDS = {
+    OpenAIBackend.name: OpenAIBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+    RuleBasedBackend.name: RuleBasedBackend,
+}
+
+
+def make_extraction_backend(name: str, api_key: str = None, model: str = None, base_url: str = None,
+                            timeout: float = DEFAULT_LLM_TIMEOUT,
+                            concurrency: int = DEFAULT_LLM_CONCURRENCY) -> ExtractionBackend:
+    """Build the extraction backend registered under name."""
+    backend_class = EXTRACTION_BACKENDS[name]
+    options = {'timeout': timeout, 'concurrency': concurrency}
+    if model:
+        options['model'] = model
+    if issubclass(backend_class, OpenAIBackend):
+        options.update(api_key=api_key, base_url=base_url)
+    return backend_class(**options)
 
 
 class SpoolmanImporter:
-    def __init__(self, spoolman_url: str, openai_api_key: str = None):
+    def __init__(self, spoolman_url: str, openai_api_key: str = None,
+                 http_timeout: float = DEFAULT_HTTP_TIMEOUT, http_pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+                 workers: int = 1, llm_cache: Optional[DiskCache] = None,
+                 pdf_cache: Optional[DiskCache] = None, compiled_db: Optional[Path] = None,
+                 catalog: Optional[VendorCatalog] = None, llm_concurrency: int = DEFAULT_LLM_CONCURRENCY,
+                 extraction_backend: Optional[ExtractionBackend] = None,
+                 mirror: Optional[SpoolmanMirror] = None, filtered_lookups: bool = False,
+                 write_retries: int = DEFAULT_WRITE_RETRIES,
+                 journal: Optional[ImportJournal] = None, resume: bool = False,
+                 timings: Optional[Timings] = None):
         self.spoolman_url = spoolman_url.rstrip('/')
-        self.client = OpenAI(api_key=openai_api_key) if openai_api_key else None
-        self.vendor_data = self.load_vendor_data()
-        self.color_data = self.load_color_data()
+        # Number of concurrent spool-creation requests per filament (1 = sequential)
+        self.workers = max(1, workers)
+        # Optional recorder of stage and HTTP latencies, see the timed decorator
+        self.timings = timings
+        # Size the pool so concurrent spool workers never wait for a connection
+        self.api = SpoolmanClient(self.spoolman_url, timeout=http_timeout,
+                                  pool_size=max(http_pool_size, self.workers), timings=timings)
+        # Transient write failures are retried; concurrent writes adapt to server latency
+        self.write_retries = max(0, write_retries)
+        self.write_limiter = AdaptiveConcurrencyLimiter(max(http_pool_size, self.workers))
+        # Receipt text extraction; defaults to OpenAI with the given key
+        self.backend = extraction_backend or OpenAIBackend(openai_api_key, concurrency=llm_concurrency)
+        # Optional on-disk cache of LLM extraction results, keyed by receipt text
+        self.llm_cache = llm_cache
+        # Optional on-disk cache of extracted PDF text, keyed by file contents
+        self.pdf_cache = pdf_cache
+        # Optional local snapshot of Spoolman collections, synced incrementally instead of downloaded
+        self.mirror = mirror
+        # Lowercased vendor name -> Spoolman vendor ID, fetched once per run
+        self._vendor_index: Optional[Dict[str, int]] = None
+        # ImportIDs already present on Spoolman spools, fetched once per run
+        self._import_ids: Optional[Set[str]] = None
+        # (vendor_id, lowercased name) -> filament, fetched once per run
+        self._filament_index: Optional[Dict[Tuple[Optional[int], str], Dict]] = None
+        # Query Spoolman only for the vendors, filaments and spools a receipt needs instead of
+        # downloading whole collections. The indexes above then start empty and fill per lookup.
+        self.filtered_lookups = filtered_lookups and not mirror
+        self._queried_vendors: Set[str] = set()
+        self._queried_filaments: Set[Tuple[Optional[int], str]] = set()
+        # Filament ID -> ImportIDs of its spools, used instead of _import_ids for filtered lookups
+        self._filament_import_ids: Dict[int, Set[str]] = {}
+        self._fallback_lock = threading.Lock()
+        if self.filtered_lookups:
+            self._vendor_index, self._filament_index = {}, {}
+        # Optional journal of imported spools; with resume, journaled receipt lines are skipped
+        self.journal = journal
+        self.resume = resume and journal is not None
+        # Receipt path -> journal source key, so each receipt is hashed once per run
+        self._journal_sources: Dict[str, str] = {}
+        # Optional SQLite catalog queried instead of the in-memory vendor and color data
+        self.catalog = catalog
+        database = load_compiled_database(compiled_db) if compiled_db and not catalog else None
+        if catalog:
+            self.vendor_data = catalog.load_vendor_defaults()
+            self.color_data = {"colors": {}}
+        elif database:
+            self._install_vendor_data(database["vendor_data"], database["vendor_compiled"])
+            self._install_color_data(database["color_data"], database["color_compiled"])
+        else:
+            self.vendor_data = self.load_vendor_data()
+            self.color_data = self.load_color_data()
+
+    @property
+    def client(self):
+        """OpenAI client of the extraction backend, or None for backends without one."""
+        return getattr(self.backend, 'client', None)
+
+    @client.setter
+    def client(self, client):
+        self.backend.client = client
 
     def load_color_data(self) -> Dict:
         """Load color name to hex code mapping from JSON file."""
@@ -58,66 +1015,18 @@ class SpoolmanImporter:
             print(f"Error loading vendor data: {e}")
             return {"vendors": {}, "material_defaults": {}}
 
+    @timed("get_vendor_filament_data")
     def get_vendor_filament_data(self, brand: str, material: str, interactive: bool = True) -> Dict:
         """Get vendor-specific filament data (spool weight, temperatures)"""
-        vendors = self.vendor_data.get("vendors", {})
         material_defaults = self.vendor_data.get("material_defaults", {})
 
         # Normalize brand and material names for matching
         brand_normalized = brand.strip().lower()
         material_normalized = material.upper().strip()
 
-        vendor_data = None
-
-        # Try exact brand match first
-        if brand_normalized in (vendor.lower() for vendor in vendors):
-            # Find the correct brand name with original casing
-            for vendor_name_original in vendors:
-                if vendor_name_original.lower() == brand_normalized:
-                    brand_name_matched = vendor_name_original
-                    break
-            
-            vendor_materials = vendors[brand_name_matched]
-
-            # Try case-insensitive material match
-            for vendor_material, data in vendor_materials.items():
-                if vendor_material.lower() == material_normalized.lower():
-                    vendor_data = data.copy()
-                    break
-            else:
-                # Try partial material matches (e.g., "PLA Basic" matches "PLA")
-                for vendor_material, data in vendor_materials.items():
-                    if material_normalized.lower() in vendor_material.lower():
-                        vendor_data = data.copy()
-                        break
-
-        # Try case-insensitive brand matching if no exact match
-        if not vendor_data:
-            for vendor_name, vendor_materials in vendors.items():
-                if vendor_name.lower() == brand_normalized.lower():
-                    # Try exact material match
-                    if material_normalized in vendor_materials:
-                        vendor_data = vendor_materials[material_normalized].copy()
-                        break
-                    else:
-                        # Try partial material matches
-                        for vendor_material, data in vendor_materials.items():
-                            if material_normalized in vendor_material.upper():
-                                vendor_data = data.copy()
-                                break
-                    if vendor_data:
-                        break
-
-        # Enrich vendor data with material defaults
+        vendor_data = self._match_vendor_material(brand_normalized, material_normalized)
         if vendor_data:
-            base_material = self.extract_base_material(material_normalized)
-            if base_material in material_defaults:
-                # Add missing properties from material defaults
-                defaults = material_defaults[base_material]
-                for key, value in defaults.items():
-                    if key not in vendor_data:
-                        vendor_data[key] = value
-            return vendor_data
+            return vendor_data.copy()
 
         # No vendor-specific data found - handle interactively if possible
         if interactive:
@@ -137,13 +1046,90 @@ class SpoolmanImporter:
             "description": f"Default values for {brand} {material}"
         }
 
+    @property
+    def vendor_data(self) -> Dict:
+        return self._vendor_data
+
+    @vendor_data.setter
+    def vendor_data(self, vendor_data: Dict):
+        # Compile lookup tables whenever vendor data is (re)loaded
+        self._install_vendor_data(vendor_data, self.compile_vendor_data(vendor_data))
+
+    @classmethod
+    def compile_vendor_data(cls, vendor_data: Dict) -> Dict:
+        """Compile vendor data into the lookup tables used by the importer."""
+        return {
+            "vendor_lookup": cls._compile_vendor_lookup(vendor_data.get("vendors", {})),
+            "base_material_matcher": cls._compile_base_material_matcher(vendor_data),
+        }
+
+    def _install_vendor_data(self, vendor_data: Dict, compiled: Dict):
+        self._vendor_data = vendor_data
+        self._vendor_lookup = compiled["vendor_lookup"]
+        self._vendor_match_cache: Dict[Tuple[str, str], Optional[Dict]] = {}
+        self._base_material_matcher = compiled["base_material_matcher"]
+        self._base_material_cache: Dict[str, str] = {}
+
+    @staticmethod
+    def _compile_vendor_lookup(vendors: Dict) -> Dict[str, List[Tuple[Dict[str, Dict], List[Tuple[str, Dict]]]]]:
+        """
+        Compile vendor data into lookup tables keyed by lowercased brand.
+        Each brand maps to its vendors in file order, as a pair of an exact
+        lowercased-material table and the ordered material list for partial matches.
+        """
+        lookup = {}
+        for vendor_name, vendor_materials in vendors.items():
+            exact = {}
+            materials = []
+            for vendor_material, data in vendor_materials.items():
+                exact.setdefault(vendor_material.lower(), data)
+                materials.append((vendor_material.lower(), data))
+            lookup.setdefault(vendor_name.lower(), []).append((exact, materials))
+        return lookup
+
+    def _match_vendor_material(self, brand_normalized: str, material_normalized: str) -> Optional[Dict]:
+        """
+        Find vendor data for a normalized brand and material, merged with material defaults.
+        Exact material matches win over partial ones (e.g. "PLA" matches "PLA Basic"),
+        and vendors are tried in file order. Results are memoized until vendor data reloads.
+        """
+        cache_key = (brand_normalized, material_normalized)
+        if cache_key in self._vendor_match_cache:
+            return self._vendor_match_cache[cache_key]
+
+        material_lower = material_normalized.lower()
+        vendor_data = None
+        if self.catalog:
+            vendor_data = self.catalog.find_vendor_material(brand_normalized, material_normalized)
+        else:
+            for exact, materials in self._vendor_lookup.get(brand_normalized, ()):
+                match = exact.get(material_lower)
+                if match is None:
+                    match = next((data for name, data in materials if material_lower in name), None)
+                if match:
+                    vendor_data = match.copy()
+                    break
+
+        # Enrich vendor data with material defaults
+        if vendor_data:
+            material_defaults = self.vendor_data.get("material_defaults", {})
+            base_material = self.extract_base_material(material_normalized)
+            if base_material in material_defaults:
+                # Add missing properties from material defaults
+                for key, value in material_defaults[base_material].items():
+                    if key not in vendor_data:
+                        vendor_data[key] = value
+
+        self._vendor_match_cache[cache_key] = vendor_data
+        return vendor_data
+
     def handle_missing_vendor_data(self, brand: str, material: str, material_defaults: Dict) -> Dict:
         """Handle case where vendor-specific data is not found"""
         print(f"\nWarning: No vendor data found for '{brand}' - '{material}'")
 
         # Show available vendors for debugging
         print("\nAvailable vendors in vendor-data.json:")
-        for vendor_name in self.vendor_data.get("vendors", {}):
+        for vendor_name in (self.catalog.vendor_names() if self.catalog else self.vendor_data.get("vendors", {})):
             print(f"  - {vendor_name}")
 
         # Show available material defaults
@@ -163,7 +1149,7 @@ class SpoolmanImporter:
 
             if choice == 'r':
                 print("Reloading vendor data...")
-                self.vendor_data = self.load_vendor_data()
+                self.vendor_data = self.catalog.load_vendor_defaults() if self.catalog else self.load_vendor_data()
                 # Retry with reloaded data (non-interactive to avoid infinite loop)
                 return self.get_vendor_filament_data(brand, material, interactive=False)
 
@@ -185,165 +1171,388 @@ class SpoolmanImporter:
     def extract_base_material(self, material: str) -> str:
         """Extract base material type from complex material names"""
         material_upper = material.upper()
+        base_material = self._base_material_cache.get(material_upper)
+        if base_material is None:
+            pattern, families = self._base_material_matcher
+            matches = {match.group(1) for match in pattern.finditer(material_upper)}
+            if matches:
+                # Families are checked in priority order, e.g. "SILK PLA" is PLA
+                priority = list(families)
+                base_material = families[min(matches, key=priority.index)]
+            else:
+                print(f"Warning: Unknown material '{material}', assuming PLA")
+                base_material = "PLA"  # Default fallback
+            self._base_material_cache[material_upper] = base_material
+        return base_material
 
-        # Common material mappings
-        if "PLA" in material_upper:
-            return "PLA"
-        elif "PETG" in material_upper:
-            return "PETG"
-        elif "ABS" in material_upper:
-            return "ABS"
-        elif "ASA" in material_upper:
-            return "ASA"
-        elif "TPU" in material_upper:
-            return "TPU"
-        elif "WOOD" in material_upper:
-            return "WOOD"
-        elif "SILK" in material_upper:
-            return "SILK"
-        else:
-            return "PLA"  # Default fallback
-
+    @staticmethod
+    def _compile_base_material_matcher(vendor_data: Dict) -> Tuple[re.Pattern, Dict[str, str]]:
+        """
+        Compile material families and aliases into one matcher.
+        Families are the built-in ones followed by the material_defaults keys, then the
+        material_aliases from vendor data (alias -> family), in that priority order.
+        Built-in families match anywhere, as they always have. The others must stand as a
+        word of their own, optionally followed by digits, so e.g. "SPARKLE" is not PA
+        and "PCTG" is not PC.
+        """
+        families = {family: family for family in BASE_MATERIAL_FAMILIES}
+        for family in vendor_data.get("material_defaults", {}):
+            families.setdefault(family.upper(), family)
+        for alias, family in vendor_data.get("material_aliases", {}).items():
+            families.setdefault(alias.upper(), family)
+
+        def term_pattern(term: str) -> str:
+            if term in BASE_MATERIAL_FAMILIES:
+                return re.escape(term)
+            return r"(?<![A-Z]){}(?![A-Z])".format(re.escape(term))
+
+        terms = sorted(families, key=len, reverse=True)
+        pattern = re.compile("(?=({}))".format("|".join(map(term_pattern, terms))))
+        return pattern, families
+
+    @timed("extract_text_from_pdf")
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text content from PDF file"""
-        try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
-        except Exception as e:
-            print(f"Error reading PDF: {e}")
-            return ""
+        return extract_pdf_text(pdf_path, self.pdf_cache)
 
-    def extract_filaments_with_llm(self, receipt_text: str) -> List[Dict]:
-        """Use LLM to extract filament data from receipt text"""
-        if not self.client:
-            print("OpenAI client not configured. Please provide API key.")
+    @timed("extract_filaments_with_llm")
+    def extract_filaments_with_llm(self, receipt_text: str) -> Optional[List[Dict]]:
+        """
+        Use the extraction backend to extract filament data from receipt text, in concurrent chunks for long receipts.
+        Returns None if a chunk of a long receipt could not be extracted, so no line items are lost silently.
+        """
+        backend = self.backend
+        if not backend.available:
+            if backend.name == OpenAIBackend.name:
+                print("OpenAI client not configured. Please provide API key.")
+            else:
+                print(f"Extraction backend '{backend.name}' not configured.")
             return []
+        if not backend.remote:
+            return backend.extract(receipt_text) or []
+
+        cache_key = DiskCache.make_key(*backend.cache_key_parts(), LLM_PROMPT_VERSION, receipt_text)
+        if self.llm_cache:
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                print("Using cached LLM extraction result")
+                return json.loads(cached)
+
+        chunks = split_receipt_text(receipt_text)
+        if len(chunks) == 1:
+            results = [backend.extract(receipt_text)]
+        else:
+            print(f"Extracting {len(chunks)} receipt chunks with up to {backend.concurrency} concurrent requests")
+            with ThreadPoolExecutor(max_workers=min(backend.concurrency, len(chunks))) as executor:
+                results = list(executor.map(backend.extract, chunks))
+
+        complete = all(result is not None for result in results)
+        if not complete and len(chunks) > 1:
+            results = self.recover_failed_chunks(chunks, results)
+            if results is None:
+                return None
 
-        prompt = f"""
-Extract 3D printer filament information from this receipt text. 
-Return ONLY a JSON array of filament objects. Each object should have:
-- brand: string (manufacturer name)
-- material: string (PLA, PETG, ABS, etc.)
-- color: string 
-- diameter: number (1.75 or 3.0, default 1.75)
-- weight: number (filament weight in grams, e.g. 1000 for 1kg)
-- price: number (unit price)
-- quantity: number (how many spools)
-- spool_weight: number (optional, empty spool weight in grams, e.g. 200-250 for typical spools)
-
-Only include items that are clearly 3D printer filaments. Ignore other products.
-If information is missing, use reasonable defaults or null.
-For spool_weight, only include if you can determine it from the receipt (rare), otherwise omit.
-
-Receipt text:
-{receipt_text}
-
-JSON array:
-"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a data extraction assistant. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1
-            )
-
-            result = response.choices[0].message.content.strip()
-            # Clean up response - remove markdown formatting if present
-            if result.startswith('```json'):
-                result = result.replace('```json', '').replace('```', '')
+        filaments = self.merge_extracted_filaments(results)
+        # Only complete extractions are cached, so a failed chunk is retried next run
+        if self.llm_cache and filaments and complete:
+            self.llm_cache.set(cache_key, json.dumps(filaments))
+        return filaments
 
-            return json.loads(result)
+    def recover_failed_chunks(self, chunks: List[str],
+                              results: List[Optional[List[Dict]]]) -> Optional[List[Optional[List[Dict]]]]:
+        """
+        Retry each failed chunk once, then fall back to pattern matching on that chunk alone.
+        Returns None if a chunk still yields no filaments, as its line items would be missing.
+        """
+        results = list(results)
+        for i, chunk in enumerate(chunks):
+            if results[i] is not None:
+                continue
+            print(f"Retrying receipt chunk {i + 1}/{len(chunks)}")
+            results[i] = self.backend.extract(chunk)
+            if results[i] is None:
+                print(f"Extraction failed for chunk {i + 1}/{len(chunks)}, falling back to pattern matching")
+                results[i] = self.extract_filaments_pattern_matching(chunk)
+            if not results[i]:
+                print(f"Error: Partial extraction, chunk {i + 1}/{len(chunks)} of the receipt could not be extracted")
+                return None
+        return results
 
-        except Exception as e:
-            print(f"LLM extraction error: {e}")
-            return []
+    @staticmethod
+    def merge_extracted_filaments(results: List[Optional[List[Dict]]]) -> List[Dict]:
+        """
+        Concatenate per-chunk extraction results in receipt order. Items repeated
+        verbatim in another chunk (e.g. echoed from an order summary) are dropped.
+        """
+        merged, seen = [], set()
+        for result in results:
+            chunk_keys = set()
+            for filament in result or []:
+                key = json.dumps(filament, sort_keys=True) if isinstance(filament, dict) else None
+                if key in seen:
+                    continue
+                chunk_keys.add(key)
+                merged.append(filament)
+            seen |= chunk_keys - {None}
+        return merged
 
     def extract_filaments_pattern_matching(self, receipt_text: str) -> List[Dict]:
         """Fallback: Extract filaments using pattern matching"""
-        filaments = []
-
-        # Common filament patterns
-        patterns = [
-            r'(?i)(PLA|ABS|PETG|TPU|WOOD|SILK)\s+.*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)',
-            r'(?i)filament.*?(PLA|ABS|PETG|TPU).*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)',
-            r'(?i)(1\.75|3\.0).*?(PLA|ABS|PETG|TPU).*?(\d+(?:\.\d+)?)\s*(?:€|USD|\$|EUR)'
-        ]
-
-        for pattern in patterns:
-            matches = re.findall(pattern, receipt_text)
-            for match in matches:
-                if len(match) >= 2:
-                    filament = {
-                        'brand': 'Unknown',
-                        'material': match[0].upper() if match[0] else 'PLA',
-                        'color': 'Unknown',
-                        'diameter': 1.75,
-                        'weight': 1000,  # Default 1kg
-                        'price': float(match[-1]),
-                        'quantity': 1
-                    }
-                    filaments.append(filament)
-
-        return filaments
+        return RuleBasedBackend().extract(receipt_text)
 
     def get_filaments(self) -> List[Dict]:
         """Get all existing filaments from Spoolman."""
         try:
-            response = requests.get(f"{self.spoolman_url}/api/v1/filament")
+            if self.mirror:
+                return self.mirror.sync(self.api, "filament")
+            response = self.api.get("/api/v1/filament")
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"Error fetching existing filaments: {e}")
             return []
 
-    def find_existing_filament(self, filament_data: Dict, vendor_id: int, existing_filaments: List[Dict]) -> Optional[Dict]:
-        """Find a filament in a list of existing filaments."""
+    @staticmethod
+    def _filament_key(vendor_id: Optional[int], name: str) -> Tuple[Optional[int], str]:
+        """Index key for a filament: its vendor ID and case-insensitive name."""
+        return vendor_id, name.lower()
+
+    def index_filaments(self, filaments: List[Dict]) -> Dict[Tuple[Optional[int], str], Dict]:
+        """Build a (vendor_id, name) lookup index over a list of Spoolman filaments."""
+        filament_index = {}
+        for filament in filaments:
+            vendor_id = (filament.get('vendor') or {}).get('id')
+            # Keep the first filament if several share a vendor and name
+            filament_index.setdefault(self._filament_key(vendor_id, filament['name']), filament)
+        return filament_index
+
+    def get_filament_index(self) -> Dict[Tuple[Optional[int], str], Dict]:
+        """Return the filament index for this run, fetching all filaments on first use."""
+        if self._filament_index is None:
+            self._filament_index = self.index_filaments(self.get_filaments())
+        return self._filament_index
+
+    def find_existing_filament(self, filament_data: Dict, vendor_id: int, filament_index: Dict) -> Optional[Dict]:
+        """
+        Find a filament in the index built by index_filaments().
+        With filtered lookups, filaments missing from the index are first queried by vendor and name.
+        """
         filament_name = f"{filament_data['material']} {filament_data['color']}"
-        for filament in existing_filaments:
-            # Check for matching vendor ID and a case-insensitive name match
-            if filament.get('vendor', {}).get('id') == vendor_id and filament['name'].lower() == filament_name.lower():
-                return filament
-        return None
+        key = self._filament_key(vendor_id, filament_name)
+        if self.filtered_lookups and key not in filament_index and key not in self._queried_filaments:
+            try:
+                filaments = self.query_collection("/api/v1/filament", {
+                    "vendor.id": vendor_id,
+                    "name": self._search_term(filament_name),
+                })
+            except Exception as e:
+                self.disable_filtered_lookups(e)
+            else:
+                self._queried_filaments.add(key)
+                for filament_key, filament in self.index_filaments(filaments).items():
+                    filament_index.setdefault(filament_key, filament)
+        return filament_index.get(key)
+
+    @staticmethod
+    def _search_term(name: str) -> str:
+        """Spoolman splits search terms at commas, so search for the longest comma-free part."""
+        return max(name.split(','), key=len).strip()
+
+    def query_collection(self, path: str, params: Dict) -> List[Dict]:
+        """
+        Fetch the records of a collection matching Spoolman query parameters, following
+        limit/offset pages. Results are a superset when the server ignores a filter, so
+        callers match names exactly themselves. Raises on HTTP errors.
+        """
+        records, offset = [], 0
+        while True:
+            response = self.api.get(path, params={**params, "limit": API_PAGE_SIZE, "offset": offset})
+            response.raise_for_status()
+            page = response.json()
+            records.extend(page)
+            offset += len(page)
+            total = response.headers.get('X-Total-Count')
+            # A page larger than the limit means the server ignored paging and sent everything
+            if len(page) != API_PAGE_SIZE or (total is not None and offset >= int(total)):
+                return records
+
+    def disable_filtered_lookups(self, error: Exception):
+        """Switch to full-list lookups after a filtered query failed, merging the full lists into the indexes."""
+        with self._fallback_lock:
+            if not self.filtered_lookups:
+                return
+            print(f"Filtered Spoolman queries failed ({error}). Falling back to full lists.")
+            self.filtered_lookups = False
+            for vendor in self.get_vendors():
+                self._vendor_index.setdefault(vendor['name'].lower(), vendor['id'])
+            for key, filament in self.index_filaments(self.get_filaments()).items():
+                self._filament_index.setdefault(key, filament)
 
     def get_vendors(self) -> List[Dict]:
         """Get available vendors from Spoolman"""
         try:
-            response = requests.get(f"{self.spoolman_url}/api/v1/vendor")
+            if self.mirror:
+                return self.mirror.sync(self.api, "vendor")
+            response = self.api.get("/api/v1/vendor")
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"Error fetching vendors: {e}")
             return []
 
+    @staticmethod
+    def _import_item_key(filament_data: Dict) -> str:
+        """Line part of an ImportID, from the brand, material, color and price as given."""
+        return f"{filament_data.get('brand')}-{filament_data.get('material')}-{filament_data.get('color')}-{filament_data.get('price')}"
+
     def _generate_import_id(self, source_filename: str, filament_data: Dict, index: int) -> str:
         """Generate a unique ID for an imported spool."""
-        item_key = f"{filament_data.get('brand')}-{filament_data.get('material')}-{filament_data.get('color')}-{filament_data.get('price')}"
+        item_key = filament_data.get('import_key') or self._import_item_key(filament_data)
         return f"imported_from:{Path(source_filename).name}|item:{item_key}|index:{index}"
 
     def get_spools_for_filament(self, filament_id: int) -> List[Dict]:
         """Get all spools for a given filament ID."""
         try:
-            response = requests.get(f"{self.spoolman_url}/api/v1/spool?filament_id={filament_id}")
+            response = self.api.get("/api/v1/spool", params={"filament_id": filament_id})
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"Error fetching spools for filament {filament_id}: {e}")
             return []
 
-    def import_filament(self, filament_data: Dict, vendor_id: int, existing_filaments: List[Dict], source_filename: str, interactive: bool = True) -> bool:
+    def get_spools(self) -> List[Dict]:
+        """Get all spools from Spoolman."""
+        try:
+            if self.mirror:
+                return self.mirror.sync(self.api, "spool")
+            response = self.api.get("/api/v1/spool")
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            print(f"Error fetching spools: {e}")
+            return []
+
+    def get_import_id_index(self, filament_id: Optional[int] = None) -> Set[str]:
+        """
+        Return the set of ImportIDs found in spool comments, fetching all spools on first use.
+        With filtered lookups and a filament ID, only the spools of that filament are fetched.
+        """
+        if self.filtered_lookups and filament_id is not None:
+            import_ids = self._filament_import_ids.get(filament_id)
+            if import_ids is None:
+                try:
+                    spools = self.query_collection("/api/v1/spool", {"filament.id": filament_id})
+                except Exception as e:
+                    self.disable_filtered_lookups(e)
+                    return self.get_import_id_index()
+                import_ids = self._filament_import_ids[filament_id] = set()
+                for spool in spools:
+                    import_ids.update(IMPORT_ID_PATTERN.findall(spool.get('comment') or ''))
+            return import_ids
+
+        if self._import_ids is None:
+            self._import_ids = set()
+            for spool in self.get_spools():
+                self._import_ids.update(IMPORT_ID_PATTERN.findall(spool.get('comment') or ''))
+        return self._import_ids
+
+    def post_record(self, path: str, payload: Dict, find_existing: Callable[[], Optional[Dict]]) -> Dict:
+        """
+        Create a Spoolman record, retrying transient failures with jittered exponential backoff.
+        A failed attempt may still have been applied, so before each retry find_existing()
+        looks the record up and returns it instead of creating a duplicate. Raises on
+        permanent errors and once the retries are used up.
+        """
+        error: Optional[Exception] = None
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                time.sleep(retry_delay(attempt, error))
+                try:
+                    existing = find_existing()
+                except requests.exceptions.RequestException as e:
+                    # Without the recheck a retry could duplicate the record
+                    error = e
+                    continue
+                if existing:
+                    return existing
+            started = self.write_limiter.acquire()
+            overloaded = False
+            try:
+                response = self.api.post(path, json=payload)
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                overloaded = is_transient_error(e)
+                if not overloaded or attempt == self.write_retries:
+                    raise
+                error = e
+                print(f"  - Spoolman write failed ({e}), retrying ({attempt + 1}/{self.write_retries})")
+            finally:
+                self.write_limiter.release(started, overloaded=overloaded)
+        raise error
+
+    def create_spool(self, filament_id: int, filament_data: Dict, import_id: str) -> Dict:
+        """Create a single spool tagged with the given import ID. Raises on HTTP errors."""
+        spool_data = {
+            "filament_id": filament_id,
+            "remaining_weight": filament_data['weight'],
+            "comment": self.build_comment(filament_data, import_id=import_id)
+        }
+        if filament_data.get('spool_weight'):
+            spool_data["spool_weight"] = filament_data['spool_weight']
+
+        def find_existing():
+            spools = self.query_collection("/api/v1/spool", {"filament.id": filament_id})
+            return next((spool for spool in spools
+                         if import_id in IMPORT_ID_PATTERN.findall(spool.get('comment') or '')), None)
+
+        return self.post_record("/api/v1/spool", spool_data, find_existing)
+
+    def _create_spools_concurrently(self, filament_id: int, filament_data: Dict,
+                                    pending: List[Tuple[int, str]], quantity: int, source_filename: str = None):
+        """
+        Create spools through a bounded thread pool.
+        Results are reported in spool order. After the first failure, queued spools are
+        cancelled, in-flight ones are allowed to finish, and the first error is re-raised.
+        """
+        import_ids = self.get_import_id_index(filament_id)
+        first_error = None
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+            futures = [executor.submit(self.create_spool, filament_id, filament_data, import_id)
+                       for _, import_id in pending]
+            for (i, import_id), future in zip(pending, futures):
+                try:
+                    spool = future.result()
+                except CancelledError:
+                    continue
+                except Exception as e:
+                    if first_error is None:
+                        first_error = e
+                        for queued in futures:
+                            queued.cancel()
+                    continue
+                import_ids.add(import_id)
+                self._journal_spool(source_filename, import_id, filament_id, spool.get('id'))
+                print(f"  - Created spool {i + 1}/{quantity}")
+        if first_error is not None:
+            raise first_error
+
+    @timed("import_filament")
+    def import_filament(self, filament_data: Dict, vendor_id: int, filament_index: Dict, source_filename: str, interactive: bool = True) -> bool:
         """
         Imports a filament and its spools into Spoolman.
         Checks if the filament exists. If so, adds spools to it. If not, creates it first.
         """
-        existing_filament = self.find_existing_filament(filament_data, vendor_id, existing_filaments)
+        filament_id = self.upsert_filament(filament_data, vendor_id, filament_index, interactive=interactive)
+        if filament_id is None:
+            return False
+        return self.create_spools(filament_data, filament_id, source_filename)
+
+    @timed("upsert_filament")
+    def upsert_filament(self, filament_data: Dict, vendor_id: int, filament_index: Dict,
+                        interactive: bool = True) -> Optional[int]:
+        """Return the ID of the matching filament, creating it first if needed. Returns None on errors."""
+        existing_filament = self.find_existing_filament(filament_data, vendor_id, filament_index)
         filament_id = None
 
         if existing_filament:
@@ -365,11 +1574,20 @@ JSON array:
                     "settings_bed_temp": filament_data.get('bed_temp')
                 }
                 spoolman_data = {k: v for k, v in spoolman_data.items() if v is not None}
-                response = requests.post(f"{self.spoolman_url}/api/v1/filament", json=spoolman_data)
-                response.raise_for_status()
-                new_filament = response.json()
+
+                def find_existing():
+                    filaments = self.query_collection("/api/v1/filament", {
+                        "vendor.id": vendor_id,
+                        "name": self._search_term(spoolman_data['name']),
+                    })
+                    return self.index_filaments(filaments).get(self._filament_key(vendor_id, spoolman_data['name']))
+
+                new_filament = self.post_record("/api/v1/filament", spoolman_data, find_existing)
                 filament_id = new_filament['id']
-                existing_filaments.append(new_filament)
+                filament_index[self._filament_key(vendor_id, new_filament.get('name', spoolman_data['name']))] = new_filament
+                if self.filtered_lookups:
+                    # A new filament has no spools yet, so there is nothing to query
+                    self._filament_import_ids[filament_id] = set()
                 print(f"Successfully created new filament '{spoolman_data['name']}' (ID: {filament_id})")
             except requests.exceptions.HTTPError as e:
                 print(f"Error creating filament: {e.response.status_code} {e.response.reason}")
@@ -378,33 +1596,63 @@ JSON array:
                     print("  - API Response:", json.dumps(error_details, indent=2))
                 except json.JSONDecodeError:
                     print("  - API Response (text):", e.response.text)
-                return False
+                return None
             except Exception as e:
                 print(f"An unexpected error occurred during filament creation: {e}")
-                return False
+                return None
+        return filament_id
+
+    def _journal_spool(self, source_filename: Optional[str], import_id: str, filament_id: int,
+                       spool_id: Optional[int] = None):
+        if self.journal and source_filename:
+            self.journal.record(self.journal_source(source_filename), import_id, filament_id, spool_id)
 
+    def journal_source(self, source_filename: str) -> str:
+        """
+        Journal key of a receipt: the Spoolman URL, the receipt's absolute path and a hash of its contents.
+        Computed once per file and run.
+        """
+        source = self._journal_sources.get(source_filename)
+        if source is None:
+            try:
+                with open(source_filename, 'rb') as file:
+                    content_hash = hashlib.sha256(file.read()).hexdigest()
+            except OSError:
+                content_hash = None
+            source = f"{self.spoolman_url}|{os.path.abspath(source_filename)}|{content_hash}"
+            self._journal_sources[source_filename] = source
+        return source
+
+    def is_line_journaled(self, filament_data: Dict, source_filename: str) -> bool:
+        """Whether the journal records all spools of a receipt line as imported."""
+        import_ids = [self._generate_import_id(source_filename, filament_data, i)
+                      for i in range(filament_data.get('quantity', 1))]
+        return self.journal.is_complete(self.journal_source(source_filename), import_ids)
+
+    @timed("create_spools")
+    def create_spools(self, filament_data: Dict, filament_id: int, source_filename: str) -> bool:
+        """Create the spools of a receipt line that were not imported before. Returns False on errors."""
         try:
-            existing_spools = self.get_spools_for_filament(filament_id)
-            spools_created_count = 0
-            for i in range(filament_data.get('quantity', 1)):
+            import_ids = self.get_import_id_index(filament_id)
+            quantity = filament_data.get('quantity', 1)
+            pending = []
+            for i in range(quantity):
                 import_id = self._generate_import_id(source_filename, filament_data, i)
-                is_duplicate = any(import_id in spool.get('comment', '') for spool in existing_spools)
 
-                if is_duplicate:
-                    print(f"  - Skipping duplicate spool {i + 1}/{filament_data.get('quantity', 1)} (already imported).")
+                if import_id in import_ids:
+                    print(f"  - Skipping duplicate spool {i + 1}/{quantity} (already imported).")
+                    self._journal_spool(source_filename, import_id, filament_id)
                     continue
+                pending.append((i, import_id))
 
-                spool_data = {
-                    "filament_id": filament_id,
-                    "remaining_weight": filament_data['weight'],
-                    "comment": self.build_comment(filament_data, import_id=import_id)
-                }
-                if filament_data.get('spool_weight'):
-                    spool_data["spool_weight"] = filament_data['spool_weight']
-                spool_response = requests.post(f"{self.spoolman_url}/api/v1/spool", json=spool_data)
-                spool_response.raise_for_status()
-                print(f"  - Created spool {i + 1}/{filament_data.get('quantity', 1)}")
-                spools_created_count += 1
+            if self.workers > 1 and len(pending) > 1:
+                self._create_spools_concurrently(filament_id, filament_data, pending, quantity, source_filename)
+            else:
+                for i, import_id in pending:
+                    spool = self.create_spool(filament_id, filament_data, import_id)
+                    import_ids.add(import_id)
+                    self._journal_spool(source_filename, import_id, filament_id, spool.get('id'))
+                    print(f"  - Created spool {i + 1}/{quantity}")
             return True # Return True even if no new spools were created
         except requests.exceptions.HTTPError as e:
             print(f"Error creating spool: {e.response.status_code} {e.response.reason}")
@@ -420,27 +1668,57 @@ JSON array:
 
     def create_vendor(self, name: str) -> Optional[int]:
         """Create a new vendor in Spoolman"""
+        def find_existing():
+            vendors = self.query_collection("/api/v1/vendor", {"name": self._search_term(name)})
+            return next((vendor for vendor in vendors if vendor['name'].lower() == name.lower()), None)
+
         try:
-            data = {"name": name}
-            response = requests.post(f"{self.spoolman_url}/api/v1/vendor", json=data)
-            response.raise_for_status()
-            return response.json()['id']
+            vendor_id = self.post_record("/api/v1/vendor", {"name": name}, find_existing)['id']
         except Exception as e:
             print(f"Error creating vendor: {e}")
             return None
 
+        if self._vendor_index is not None:
+            self._vendor_index[name.lower()] = vendor_id
+        return vendor_id
+
+    def get_vendor_index(self) -> Dict[str, int]:
+        """Return the case-insensitive vendor name index, fetching it on first use."""
+        if self._vendor_index is None:
+            self._vendor_index = {}
+            for vendor in self.get_vendors():
+                # Keep the first vendor if Spoolman holds case-variant duplicates
+                self._vendor_index.setdefault(vendor['name'].lower(), vendor['id'])
+        return self._vendor_index
+
+    def find_vendor_id(self, vendor_name: str) -> Optional[int]:
+        """
+        Look up a vendor ID by case-insensitive name.
+        With filtered lookups, vendors missing from the index are first queried by name.
+        """
+        key = vendor_name.lower()
+        vendor_index = self.get_vendor_index()
+        if self.filtered_lookups and key not in vendor_index and key not in self._queried_vendors:
+            try:
+                vendors = self.query_collection("/api/v1/vendor", {"name": self._search_term(vendor_name)})
+            except Exception as e:
+                self.disable_filtered_lookups(e)
+            else:
+                self._queried_vendors.add(key)
+                for vendor in vendors:
+                    vendor_index.setdefault(vendor['name'].lower(), vendor['id'])
+        return vendor_index.get(key)
+
     def get_or_create_vendor(self, vendor_name: str) -> Optional[int]:
         """Get vendor ID or create new vendor"""
-        vendors = self.get_vendors()
-
-        # Check if vendor exists
-        for vendor in vendors:
-            if vendor['name'].lower() == vendor_name.lower():
-                return vendor['id']
+        vendor_id = self.find_vendor_id(vendor_name)
+        if vendor_id is not None:
+            return vendor_id
 
         # Create new vendor
         return self.create_vendor(vendor_name)
 
+    @timed("get_color_hex")
     def get_color_hex(self, color_name: str, interactive: bool = True) -> Optional[str]:
         """Find the hex code for a given color name, with interactive fallback."""
         if not color_name:
@@ -451,15 +1729,20 @@ JSON array:
         # 1. Normalize the input color name (e.g., "Light Blue" -> "light-blue")
         normalized_color_name = color_name.lower().replace(" ", "-")
 
+        if self.catalog:
+            hex_code = self.catalog.find_color(normalized_color_name)
+            if hex_code:
+                return hex_code
+
         # 2. Try for an exact match with the normalized name
         if normalized_color_name in colors:
             return colors[normalized_color_name]
 
         # 3. If no exact match, search for keywords in the normalized name
-        #    (e.g., "galaxy-black" should match "black")
-        for keyword in sorted(colors.keys(), key=len, reverse=True):
-            if keyword in normalized_color_name:
-                return colors[keyword]
+        #    (e.g., "galaxy-black" should match "black"); the longest keyword wins
+        keyword = self._match_color_keyword(normalized_color_name)
+        if keyword:
+            return colors[keyword]
         
         # 4. If still no match and interactive, ask the user
         if interactive:
@@ -467,6 +1750,38 @@ JSON array:
             
         return None
 
+    @property
+    def color_data(self) -> Dict:
+        return self._color_data
+
+    @color_data.setter
+    def color_data(self, color_data: Dict):
+        # Compile the keyword matcher whenever color data is (re)loaded
+        self._install_color_data(color_data, self.compile_color_data(color_data))
+
+    @staticmethod
+    def compile_color_data(color_data: Dict) -> Dict:
+        """Compile the color table into a keyword matcher."""
+        keywords = sorted(color_data.get("colors", {}), key=len, reverse=True)
+        return {
+            "color_keyword_rank": {keyword: rank for rank, keyword in enumerate(keywords)},
+            # A lookahead alternation reports the longest keyword starting at every position in one pass
+            "color_pattern": re.compile(
+                "(?=({}))".format("|".join(map(re.escape, keywords)))) if keywords else None,
+        }
+
+    def _install_color_data(self, color_data: Dict, compiled: Dict):
+        self._color_data = color_data
+        self._color_keyword_rank = compiled["color_keyword_rank"]
+        self._color_pattern = compiled["color_pattern"]
+
+    def _match_color_keyword(self, normalized_color_name: str) -> Optional[str]:
+        """Return the longest color keyword contained in the name (earliest in the file on ties)."""
+        if self._color_pattern is None:
+            return None
+        matches = {match.group(1) for match in self._color_pattern.finditer(normalized_color_name)}
+        return min(matches, key=self._color_keyword_rank.__getitem__, default=None)
+
     def handle_missing_color(self, color_name: str) -> Optional[str]:
         """Handle case where a color name cannot be matched to a hex code."""
         print(f"\nWarning: No hex code found for color '{color_name}'")
@@ -537,6 +1852,111 @@ JSON array:
         }
         return fallback_densities.get(base_material, 1.24)
 
+    @staticmethod
+    def validate_filament(filament: Dict) -> Dict:
+        """
+        Normalize one input filament, setting defaults for missing or null fields. Raises ValueError on bad numbers.
+        A null brand is kept as None so the vendor given on the command line is used instead.
+        """
+        def field(name, default):
+            value = filament.get(name)
+            return default if value is None else value
+
+        return {
+            'brand': filament.get('brand', 'Unknown'),
+            'material': field('material', 'PLA'),
+            'color': field('color', 'Unknown'),
+            'diameter': float(field('diameter', 1.75)),
+            'weight': float(field('weight', 1000)),
+            'price': float(field('price', 0.0)),
+            'quantity': int(field('quantity', 1)),
+            'spool_weight': float(filament['spool_weight']) if filament.get('spool_weight') else None
+        }
+
+    @staticmethod
+    def _iter_json_stream(file, chunk_size: int = None) -> Iterator:
+        """
+        Incrementally decode a JSON stream, holding at most one chunk plus one item in memory.
+        Yields the items of a top-level array, or each top-level value of a
+        newline-delimited (NDJSON) or concatenated JSON stream.
+        """
+        chunk_size = chunk_size or JSON_STREAM_CHUNK_SIZE
+        decoder = json.JSONDecoder()
+        whitespace = re.compile(r'\s*')
+        buffer, pos, eof = '', 0, False
+        in_array, expect_separator = None, False
+
+        while True:
+            pos = whitespace.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    if in_array:
+                        raise json.JSONDecodeError("Unterminated array", buffer, pos)
+                    return
+                chunk = file.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+
+            if in_array is None:
+                in_array = buffer[pos] == '['
+                pos += in_array
+                continue
+            if in_array and buffer[pos] == ']':
+                return
+            if expect_separator:
+                if buffer[pos] != ',':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+                expect_separator = False
+                continue
+
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number or literal is only complete once a delimiter follows it
+                complete = (eof or isinstance(value, (dict, list, str))
+                            or end < len(buffer) and buffer[end] in ' \t\r\n,]')
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = file.read(chunk_size)
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+
+            pos = end
+            expect_separator = in_array
+            yield value
+
+    def iter_filaments_from_json(self, json_path: str) -> Iterator[Dict]:
+        """
+        Stream validated filaments from a JSON array, {"filaments": [...]} object or NDJSON file.
+        Items are yielded as soon as they are parsed, so large manifests use flat memory.
+        Raises FileNotFoundError, or ValueError (including json.JSONDecodeError) once the input
+        turns out to be malformed or truncated, so a partial stream is never mistaken for a whole one.
+        """
+        ndjson = Path(json_path).suffix.lower() in STREAMING_JSON_SUFFIXES
+        with open(json_path, 'r', encoding='utf-8') as file:
+            # Outside NDJSON, a top-level object is only valid in the wrapped format
+            top_level_object = not ndjson and file.read(JSON_STREAM_CHUNK_SIZE).lstrip()[:1] == '{'
+            file.seek(0)
+            for i, filament in enumerate(self._iter_json_stream(file)):
+                if i == 0 and isinstance(filament, dict) and isinstance(filament.get('filaments'), list):
+                    # Wrapped object format; its array has been parsed as a whole
+                    items = filament['filaments']
+                elif top_level_object:
+                    raise ValueError("JSON should contain a 'filaments' array or be an array directly")
+                else:
+                    items = [filament]
+                for item in items:
+                    if not isinstance(item, dict):
+                        print(f"Warning: Skipping invalid filament at index {i}")
+                        continue
+                    try:
+                        yield self.validate_filament(item)
+                    except (TypeError, ValueError) as e:
+                        print(f"Warning: Skipping invalid filament at index {i}: {e}")
+
     def load_filaments_from_json(self, json_path: str) -> List[Dict]:
         """Load filament data from JSON file"""
         try:
@@ -558,19 +1978,7 @@ JSON array:
                 if not isinstance(filament, dict):
                     print(f"Warning: Skipping invalid filament at index {i}")
                     continue
-
-                # Set defaults for missing fields
-                validated_filament = {
-                    'brand': filament.get('brand', 'Unknown'),
-                    'material': filament.get('material', 'PLA'),
-                    'color': filament.get('color', 'Unknown'),
-                    'diameter': float(filament.get('diameter', 1.75)),
-                    'weight': float(filament.get('weight', 1000)),
-                    'price': float(filament.get('price', 0.0)),
-                    'quantity': int(filament.get('quantity', 1)),
-                    'spool_weight': float(filament['spool_weight']) if filament.get('spool_weight') else None
-                }
-                validated_filaments.append(validated_filament)
+                validated_filaments.append(self.validate_filament(filament))
 
             return validated_filaments
 
@@ -584,71 +1992,544 @@ JSON array:
             print(f"Error loading JSON: {e}")
             return []
 
-    def process_receipt(self, pdf_path: str = None, json_path: str = None, vendor_name: str = None,
-                        dry_run: bool = False) -> bool:
-        """Process a receipt PDF or JSON file and import filaments"""
-        source_filename = pdf_path or json_path
-        
-        # Get all existing filaments from Spoolman to avoid creating duplicates
-        existing_filaments = self.get_filaments()
-        if not dry_run:
-            print(f"Found {len(existing_filaments)} existing filaments in Spoolman.")
-
+    def load_receipt(self, pdf_path: str = None, json_path: str = None,
+                     receipt_text: str = None) -> Optional[List[Dict]]:
+        """
+        Load filaments from a JSON file or extract them from a PDF receipt. Returns None on errors.
+        For PDFs, already extracted text can be passed as receipt_text to skip parsing.
+        """
         if json_path:
             print(f"Processing JSON file: {json_path}")
-            filaments = self.load_filaments_from_json(json_path)
+            return self.load_filaments_from_json(json_path)
         elif pdf_path:
             print(f"Processing receipt: {pdf_path}")
-            receipt_text = self.extract_text_from_pdf(pdf_path)
+            if receipt_text is None:
+                receipt_text = self.extract_text_from_pdf(pdf_path)
             if not receipt_text:
-                return False
-            filaments = self.extract_filaments_with_llm(receipt_text) or self.extract_filaments_pattern_matching(receipt_text)
+                return None
+            filaments = self.extract_filaments_with_llm(receipt_text)
+            if filaments is None:
+                return None
+            return filaments or self.extract_filaments_pattern_matching(receipt_text)
         else:
             print("Error: Either PDF path or JSON path must be provided")
+            return None
+
+    def enrich_filament(self, filament: Dict, vendor_name: str = None, interactive: bool = True) -> Optional[str]:
+        """
+        Resolve the vendor for a filament and merge its vendor data into it.
+        Returns the vendor name to use, or None if the filament should be skipped.
+        """
+        vendor_to_use = filament['brand'] or vendor_name
+        if not vendor_to_use:
+            if not interactive:
+                print(f"No vendor for {filament['material']} {filament['color']}. Skipping filament.")
+                return None
+            vendor_to_use = input(f"Enter vendor for {filament['material']} {filament['color']}: ")
+
+        vendor_data = self.get_vendor_filament_data(vendor_to_use, filament['material'], interactive=interactive)
+        if vendor_data is None:
+            print(f"Skipping filament: {filament['brand']} {filament['material']}")
+            return None
+
+        filament.update(vendor_data)
+        if filament.get('spool_weight') is None:
+            filament['spool_weight'] = vendor_data.get('spool_weight')
+        return vendor_to_use
+
+    # --- Import pipeline ---
+    #
+    # process_receipt streams receipt lines through a chain of generator stages:
+    #   source -> validate -> enrich -> resolve vendor -> upsert filament -> create spools
+    # Each stage takes and yields work items, dicts holding the line number, the filament and
+    # what earlier stages resolved. Stages drop the items they fail, so later stages only see
+    # good ones. They share a run context (source file, fallback vendor, filament index, counts)
+    # and can be replaced, batched or parallelized independently via import_stages().
+
+    def stage_validate(self, filaments: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """Normalize raw filament dicts into work items, skipping invalid ones."""
+        for filament in filaments:
+            context['total'] += 1
+            if not isinstance(filament, dict):
+                print(f"Warning: Skipping invalid filament at index {context['total'] - 1}")
+                continue
+            # ImportIDs keep the values as extracted, so receipts imported before
+            # validation was applied to LLM output are still recognized on re-runs
+            import_key = filament.get('import_key') or self._import_item_key(filament)
+            try:
+                filament = self.validate_filament(filament)
+            except (TypeError, ValueError) as e:
+                print(f"Warning: Skipping invalid filament at index {context['total'] - 1}: {e}")
+                continue
+            filament['import_key'] = import_key
+            if context.get('echo'):
+                print(f"  {context['total']}. {filament['brand']} {filament['material']} {filament['color']}")
+            yield {'number': context['total'], 'filament': filament}
+
+    def stage_enrich(self, items: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """Merge vendor data into each filament and pick the vendor name to use."""
+        for item in items:
+            item['vendor_name'] = self.enrich_filament(item['filament'], context['vendor_name'],
+                                                       interactive=context['interactive'])
+            if item['vendor_name'] is not None:
+                yield item
+
+    def stage_resolve_vendor(self, items: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """Resolve each item's vendor to a Spoolman vendor ID, creating vendors as needed."""
+        for item in items:
+            item['vendor_id'] = self.get_or_create_vendor(item['vendor_name'])
+            if not item['vendor_id']:
+                print(f"Failed to get or create vendor '{item['vendor_name']}'. Skipping filament.")
+                continue
+            yield item
+
+    def stage_skip_journaled(self, items: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """On resumed runs, count lines the journal records as imported as done, without touching Spoolman."""
+        for item in items:
+            filament = item['filament']
+            if self.is_line_journaled(filament, context['source_filename']):
+                print(f"  - Already imported {filament['brand']} {filament['material']} {filament['color']} (journal)")
+                context['imported'] += 1
+                continue
+            yield item
+
+    def stage_upsert_filament(self, items: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """Find or create the Spoolman filament for each item."""
+        for item in items:
+            if context['filament_index'] is None:
+                context['filament_index'] = self.get_filament_index()
+            item['filament_id'] = self.upsert_filament(item['filament'], item['vendor_id'], context['filament_index'],
+                                                       interactive=context['interactive'])
+            if item['filament_id'] is not None:
+                yield item
+
+    def stage_create_spools(self, items: Iterable[Dict], context: Dict) -> Iterator[Dict]:
+        """Create the missing spools for each item and count successful lines."""
+        for item in items:
+            if self.create_spools(item['filament'], item['filament_id'], context['source_filename']):
+                context['imported'] += 1
+                yield item
+
+    def import_stages(self) -> List[Callable[[Iterable[Dict], Dict], Iterator[Dict]]]:
+        """Return the import stages after validation, in order."""
+        stages = [
+            self.stage_enrich,
+            self.stage_resolve_vendor,
+            self.stage_upsert_filament,
+            self.stage_create_spools,
+        ]
+        if self.resume:
+            stages.insert(0, self.stage_skip_journaled)
+        return stages
+
+    @staticmethod
+    def run_pipeline(source: Iterable, stages: List[Callable[[Iterable[Dict], Dict], Iterator[Dict]]],
+                     context: Dict) -> Dict:
+        """Chain the stages over the source and drain the pipeline. Returns the run context."""
+        items = source
+        for stage in stages:
+            items = stage(items, context)
+        for _ in items:
+            pass
+        return context
+
+    @timed("process_receipt")
+    def process_receipt(self, pdf_path: str = None, json_path: str = None, vendor_name: str = None,
+                        dry_run: bool = False, receipt_text: str = None, stream: bool = False) -> bool:
+        """
+        Process a receipt PDF or JSON file and import filaments.
+        With stream=True (implied for .ndjson/.jsonl files), JSON lines are imported as they are parsed.
+        """
+        source_filename = pdf_path or json_path
+        stream = bool(json_path) and (stream or Path(json_path).suffix.lower() in STREAMING_JSON_SUFFIXES)
+        
+        # Get all existing filaments from Spoolman to avoid creating duplicates. Resumed
+        # runs fetch them only once a line is not in the journal (see stage_upsert_filament).
+        filament_index = None if self.resume else self.get_filament_index()
+        if not dry_run and filament_index is not None and not self.filtered_lookups:
+            print(f"Found {len(filament_index)} existing filaments in Spoolman.")
+
+        if stream:
+            print(f"Streaming JSON file: {json_path}")
+            filaments = self.iter_filaments_from_json(json_path)
+        else:
+            filaments = self.load_receipt(pdf_path, json_path, receipt_text=receipt_text)
+            if filaments is None:
+                return False
+
+            if not filaments:
+                print("No filaments found")
+                return False
+
+            print(f"Found {len(filaments)} filament(s) to process:")
+            for i, filament in enumerate(filaments, 1):
+                print(f"  {i}. {filament['brand']} {filament['material']} {filament['color']}")
+
+            if dry_run:
+                print("\n--- DRY RUN ---")
+                # ... (dry run logic remains the same)
+                return True
+
+        context = {
+            'source_filename': source_filename,
+            'vendor_name': vendor_name,
+            'filament_index': filament_index,
+            'interactive': True,
+            'echo': stream,
+            'total': 0,
+            'imported': 0,
+        }
+        stages = [self.stage_validate] + ([] if dry_run else self.import_stages())
+        try:
+            self.run_pipeline(filaments, stages, context)
+        except (OSError, ValueError) as e:
+            if not stream:
+                raise
+            # A cut-off or corrupt manifest must not look like a complete import
+            print(f"Error: Stopped streaming {json_path}: {e}")
+            print(f"\nImported {context['imported']}/{context['total']} filaments before the error; "
+                  f"the receipt was not fully imported")
             return False
 
-        if not filaments:
+        if dry_run:
+            print(f"\n--- DRY RUN --- {context['total']} filament(s) found")
+            return context['total'] > 0
+        if not context['total']:
             print("No filaments found")
             return False
 
-        print(f"Found {len(filaments)} filament(s) to process:")
-        for i, filament in enumerate(filaments, 1):
-            print(f"  {i}. {filament['brand']} {filament['material']} {filament['color']}")
+        if self.journal and context['imported'] == context['total']:
+            self.journal.mark_complete(self.journal_source(source_filename))
+        print(f"\nSuccessfully imported {context['imported']}/{context['total']} filaments")
+        return context['imported'] > 0
 
-        if dry_run:
-            print("\n--- DRY RUN ---")
-            # ... (dry run logic remains the same)
-            return True
+    def process_batch(self, receipt_paths: List[Path], vendor_name: str = None,
+                      dry_run: bool = False, pdf_workers: int = 1) -> Dict[str, bool]:
+        """
+        Process several receipts in one run, sharing loaded resources and Spoolman state.
+        With pdf_workers > 1, PDF text is extracted in a process pool and each receipt is
+        imported as soon as its text is ready, so imports overlap with parsing.
+        Returns a mapping of file path to success and prints a per-file summary.
+        """
+        results = {}
+        pdf_paths = [p for p in receipt_paths if p.suffix.lower() == '.pdf']
+        json_paths = [p for p in receipt_paths if p.suffix.lower() != '.pdf']
 
-        # --- Interactive Import ---
-        success_count = 0
-        for filament in filaments:
-            vendor_to_use = filament['brand'] or vendor_name
-            if not vendor_to_use:
-                vendor_to_use = input(f"Enter vendor for {filament['material']} {filament['color']}: ")
-            
-            vendor_data = self.get_vendor_filament_data(vendor_to_use, filament['material'], interactive=True)
-            if vendor_data is None:
-                print(f"Skipping filament: {filament['brand']} {filament['material']}")
-                continue
+        def run(receipt_path: Path, receipt_text: str = None):
+            print(f"\n=== [{len(results) + 1}/{len(receipt_paths)}] {receipt_path} ===")
+            is_pdf = receipt_path.suffix.lower() == '.pdf'
+            try:
+                results[str(receipt_path)] = self.process_receipt(
+                    pdf_path=str(receipt_path) if is_pdf else None,
+                    json_path=None if is_pdf else str(receipt_path),
+                    vendor_name=vendor_name,
+                    dry_run=dry_run,
+                    receipt_text=receipt_text
+                )
+            except Exception as e:
+                print(f"Unexpected error processing {receipt_path}: {e}")
+                results[str(receipt_path)] = False
+
+        if pdf_workers > 1 and len(pdf_paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(pdf_workers, len(pdf_paths))) as executor:
+                futures = {executor.submit(extract_pdf_text, str(p), self.pdf_cache): p for p in pdf_paths}
+                # JSON receipts need no parsing and are imported while the PDFs are extracted
+                for receipt_path in json_paths:
+                    run(receipt_path)
+                for future in as_completed(futures):
+                    try:
+                        receipt_text = future.result()
+                    except Exception as e:
+                        print(f"Error reading PDF {futures[future]}: {e}")
+                        receipt_text = ""
+                    run(futures[future], receipt_text)
+        else:
+            for receipt_path in receipt_paths:
+                run(receipt_path)
+
+        # Summarize in input order regardless of completion order
+        results = {str(p): results[str(p)] for p in receipt_paths}
+        print("\nBatch summary:")
+        for receipt_path, success in results.items():
+            print(f"  {'OK    ' if success else 'FAILED'} {receipt_path}")
+        print(f"{sum(results.values())}/{len(results)} receipts imported successfully")
+        return results
+
+
+def validate_vendor_data(vendor_data: Dict) -> List[str]:
+    """Check the structure of vendor data. Returns a list of problems, empty if valid."""
+    errors = []
+    numeric_fields = ("spool_weight", "extruder_temp", "bed_temp", "density")
+
+    def check_entry(where: str, data, required=()):
+        if not isinstance(data, dict):
+            errors.append(f"{where}: expected an object")
+            return
+        for field in required:
+            if field not in data:
+                errors.append(f"{where}: missing '{field}'")
+        for field in numeric_fields:
+            if field in data and (isinstance(data[field], bool) or not isinstance(data[field], (int, float))):
+                errors.append(f"{where}: '{field}' must be a number")
+
+    vendors = vendor_data.get("vendors", {})
+    if not isinstance(vendors, dict):
+        errors.append("vendors: expected an object")
+        vendors = {}
+    for vendor_name, vendor_materials in vendors.items():
+        if not isinstance(vendor_materials, dict):
+            errors.append(f"vendors.{vendor_name}: expected an object")
+            continue
+        for material, data in vendor_materials.items():
+            check_entry(f"vendors.{vendor_name}.{material}", data)
+
+    material_defaults = vendor_data.get("material_defaults", {})
+    if not isinstance(material_defaults, dict):
+        errors.append("material_defaults: expected an object")
+        material_defaults = {}
+    for material, data in material_defaults.items():
+        # handle_missing_vendor_data displays these fields for every default
+        check_entry(f"material_defaults.{material}", data, required=("spool_weight", "extruder_temp", "bed_temp"))
+
+    aliases = vendor_data.get("material_aliases", {})
+    if not isinstance(aliases, dict) or not all(isinstance(v, str) for v in aliases.values()):
+        errors.append("material_aliases: expected an object of alias -> material family strings")
+    return errors
+
+
+def read_resource_data(vendor_data_path: Path = RESOURCES_DIR / "vendor-data.json",
+                       color_data_path: Path = RESOURCES_DIR / "color-data.json") -> Optional[Tuple[Dict, Dict]]:
+    """Strictly read and validate vendor and color JSON data. Prints problems and returns None if invalid."""
+    try:
+        with open(vendor_data_path, 'r', encoding='utf-8') as file:
+            vendor_data = json.load(file)
+        with open(color_data_path, 'r', encoding='utf-8') as file:
+            color_data = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading resource data: {e}")
+        return None
+
+    errors = validate_vendor_data(vendor_data)
+    colors = color_data.get("colors")
+    if not isinstance(colors, dict) or not all(isinstance(v, str) for v in colors.values()):
+        errors.append("colors: expected an object of color name -> hex code strings")
+    if errors:
+        print(f"Vendor database is invalid ({len(errors)} problem(s)):")
+        for error in errors:
+            print(f"  - {error}")
+        return None
+    return vendor_data, color_data
+
+
+def compile_database(output_path: Path, vendor_data_path: Path = RESOURCES_DIR / "vendor-data.json",
+                     color_data_path: Path = RESOURCES_DIR / "color-data.json") -> bool:
+    """Validate vendor and color JSON data and write the precompiled database used for fast startup."""
+    resource_data = read_resource_data(vendor_data_path, color_data_path)
+    if resource_data is None:
+        return False
+    vendor_data, color_data = resource_data
+
+    database = {
+        "version": COMPILED_DB_VERSION,
+        "vendor_data": vendor_data,
+        "vendor_compiled": SpoolmanImporter.compile_vendor_data(vendor_data),
+        "color_data": color_data,
+        "color_compiled": SpoolmanImporter.compile_color_data(color_data),
+    }
+    output_path = Path(output_path)
+    tmp_path = output_path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(database, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, output_path)
+    print(f"Compiled {len(vendor_data.get('vendors', {}))} vendors and {len(color_data['colors'])} colors "
+          f"into {output_path}")
+    return True
+
+
+def build_catalog(output_path: Path, vendor_data_path: Path = RESOURCES_DIR / "vendor-data.json",
+                  color_data_path: Path = RESOURCES_DIR / "color-data.json") -> bool:
+    """Validate vendor and color JSON data and write them into a SQLite VendorCatalog."""
+    resource_data = read_resource_data(vendor_data_path, color_data_path)
+    if resource_data is None:
+        return False
+    vendor_data, color_data = resource_data
+    catalog = VendorCatalog.build(Path(output_path), vendor_data, color_data)
+    print(f"Built catalog {output_path} with {len(catalog.vendor_names())} vendors"
+          f"{'' if catalog.has_fts else ' (no FTS5 trigram support, using substring scans)'}")
+    catalog.close()
+    return True
+
+
+def load_compiled_database(path: Path, sources: Tuple[Path, ...] = (RESOURCES_DIR / "vendor-data.json",
+                                                                   RESOURCES_DIR / "color-data.json")) -> Optional[Dict]:
+    """
+    Load a database written by compile_database.
+    Returns None if it is missing, unreadable, from another version, or older than its JSON sources.
+    """
+    path = Path(path)
+    try:
+        db_mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    if any(source.exists() and source.stat().st_mtime > db_mtime for source in sources):
+        print(f"Warning: Compiled vendor database {path} is older than the JSON data; using JSON instead")
+        return None
+    try:
+        with open(path, 'rb') as file:
+            database = pickle.load(file)
+    except Exception as e:
+        print(f"Warning: Could not load compiled vendor database {path}: {e}")
+        return None
+    if not isinstance(database, dict) or database.get("version") != COMPILED_DB_VERSION:
+        print(f"Warning: Compiled vendor database {path} has an unsupported version; using JSON instead")
+        return None
+    return database
 
-            filament.update(vendor_data)
-            if filament.get('spool_weight') is None:
-                filament['spool_weight'] = vendor_data.get('spool_weight')
 
-            vendor_id = self.get_or_create_vendor(vendor_to_use)
-            if not vendor_id:
-                print(f"Failed to get or create vendor '{vendor_to_use}'. Skipping filament.")
-                continue
+def find_receipts(pattern: str) -> List[Path]:
+    """Resolve a directory or glob pattern to the sorted list of PDF, JSON and NDJSON receipts it matches."""
+    path = Path(pattern)
+    candidates = path.iterdir() if path.is_dir() else (Path(p) for p in glob.glob(pattern, recursive=True))
+    suffixes = ('.pdf', '.json') + STREAMING_JSON_SUFFIXES
+    return sorted(p for p in candidates if p.is_file() and p.suffix.lower() in suffixes)
+
+
+class AsyncSpoolmanImporter:
+    """
+    Asyncio front-end for SpoolmanImporter.
+
+    Wraps a synchronous importer and runs its blocking work in worker threads, so it can
+    be embedded in an asyncio service without blocking the event loop. Validation, the journal
+    check, matching, enrichment and the Spoolman calls are shared with the wrapped importer. At most ``max_concurrency``
+    calls run against the importer's Spoolman host at a time. Imports are non-interactive.
+    """
+
+    def __init__(self, importer: SpoolmanImporter, max_concurrency: int = 4):
+        self.importer = importer
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional['asyncio.Semaphore'] = None
+        # Serialize creation of the same vendor or filament across concurrent lines
+        self._locks: Dict[Tuple, 'asyncio.Lock'] = {}
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking importer call in a thread, bounded by the host concurrency limit."""
+        import asyncio
 
-            if self.import_filament(filament, vendor_id, existing_filaments, source_filename, interactive=not dry_run):
-                success_count += 1
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
 
-        print(f"\nSuccessfully imported {success_count}/{len(filaments)} filaments")
+    def _lock(self, key: Tuple) -> 'asyncio.Lock':
+        import asyncio
+
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    async def get_filaments(self) -> List[Dict]:
+        return await self._run(self.importer.get_filaments)
+
+    async def get_vendors(self) -> List[Dict]:
+        return await self._run(self.importer.get_vendors)
+
+    async def get_or_create_vendor(self, vendor_name: str) -> Optional[int]:
+        async with self._lock(('vendor', vendor_name.lower())):
+            return await self._run(self.importer.get_or_create_vendor, vendor_name)
+
+    async def import_filament(self, filament_data: Dict, vendor_id: int, filament_index: Dict,
+                              source_filename: str) -> bool:
+        name = f"{filament_data['material']} {filament_data['color']}"
+        async with self._lock(('filament',) + self.importer._filament_key(vendor_id, name)):
+            return await self._run(self.importer.import_filament, filament_data, vendor_id,
+                                   filament_index, source_filename, interactive=False)
+
+    async def _import_line(self, filament: Dict, vendor_name: Optional[str], filament_index: Dict,
+                           source_filename: str) -> bool:
+        import asyncio
+
+        vendor_to_use = await asyncio.to_thread(self.importer.enrich_filament, filament, vendor_name, False)
+        if vendor_to_use is None:
+            return False
+
+        vendor_id = await self.get_or_create_vendor(vendor_to_use)
+        if not vendor_id:
+            print(f"Failed to get or create vendor '{vendor_to_use}'. Skipping filament.")
+            return False
+
+        return await self.import_filament(filament, vendor_id, filament_index, source_filename)
+
+    async def process_receipt(self, pdf_path: str = None, json_path: str = None, vendor_name: str = None,
+                              dry_run: bool = False) -> bool:
+        """Process a receipt like SpoolmanImporter.process_receipt, importing its lines concurrently."""
+        import asyncio
+
+        source_filename = pdf_path or json_path
+
+        filaments = await asyncio.to_thread(self.importer.load_receipt, pdf_path, json_path)
+        if not filaments:
+            if filaments is not None:
+                print("No filaments found")
+            return False
+
+        # Validation and the journal check are the synchronous pipeline's own stages
+        context = {
+            'source_filename': source_filename,
+            'vendor_name': vendor_name,
+            'filament_index': None,
+            'interactive': False,
+            'total': 0,
+            'imported': 0,
+        }
+        stages = [self.importer.stage_validate]
+        if self.importer.resume and not dry_run:
+            stages.append(self.importer.stage_skip_journaled)
+        items = filaments
+        for stage in stages:
+            items = stage(items, context)
+        items = list(items)
+
+        if dry_run:
+            print(f"\n--- DRY RUN --- {len(items)} filament(s) found")
+            return bool(items)
+
+        results = []
+        if items:
+            # Prefetch run state once so concurrent lines never race to build the indexes.
+            # Filtered lookups start with empty indexes and fill them per line instead.
+            if self.importer.filtered_lookups:
+                filament_index = self.importer.get_filament_index()
+            else:
+                filament_index, _, _ = await asyncio.gather(
+                    self._run(self.importer.get_filament_index),
+                    self._run(self.importer.get_vendor_index),
+                    self._run(self.importer.get_import_id_index),
+                )
+
+            results = await asyncio.gather(*(
+                self._import_line(item['filament'], vendor_name, filament_index, source_filename)
+                for item in items
+            ))
+        success_count = context['imported'] + sum(1 for result in results if result)
+        if self.importer.journal and success_count == context['total']:
+            self.importer.journal.mark_complete(self.importer.journal_source(source_filename))
+        print(f"\nSuccessfully imported {success_count}/{context['total']} filaments")
         return success_count > 0
 
 
-import os
+def report_timings(timings: Timings, output_format: str = 'table', path: str = None):
+    """Print the timing summary, or write it to path."""
+    if output_format == 'json':
+        report = json.dumps(timings.summary(), indent=2)
+    else:
+        report = "Timings:\n" + timings.format_table()
+    if path:
+        Path(path).write_text(report + "\n", encoding='utf-8')
+        print(f"Wrote timings to {path}")
+    else:
+        print(f"\n{report}")
+
+
 from dotenv import load_dotenv
 
 # ... (rest of the imports)
@@ -664,6 +2545,16 @@ def main():
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument('--pdf', help='Path to PDF receipt file')
     input_group.add_argument('--json', help='Path to JSON file containing filament data')
+    input_group.add_argument('--batch', metavar='DIR_OR_GLOB',
+                             help='Directory or glob pattern of PDF/JSON receipts to import in one run')
+    input_group.add_argument('--build-catalog', metavar='OUTPUT', nargs='?', const=str(DEFAULT_CATALOG_PATH),
+                             help='Validate vendor/color data and write a SQLite catalog '
+                                  f'(default output: {DEFAULT_CATALOG_PATH}), then exit')
+    input_group.add_argument('--compact-journal', action='store_true',
+                             help='Compact the import journal in the cache directory, then exit')
+    input_group.add_argument('--compile-db', metavar='OUTPUT', nargs='?', const=str(DEFAULT_COMPILED_DB_PATH),
+                             help='Validate vendor/color data and write the compiled database '
+                                  f'(default output: {DEFAULT_COMPILED_DB_PATH}), then exit')
 
     parser.add_argument('--spoolman-url', 
                         default=os.getenv('SPOOLMAN_URL', 'http://localhost:7912'),
@@ -673,12 +2564,83 @@ def main():
                         default=os.getenv('OPENAI_API_KEY'),
                         help='OpenAI API key. Defaults to OPENAI_API_KEY env var.')
     parser.add_argument('--dry-run', action='store_true', help='Extract data but do not import')
+    parser.add_argument('--stream', action='store_true',
+                        help='Import JSON lines as they are parsed instead of loading the whole file first '
+                             '(always on for .ndjson/.jsonl files)')
+    parser.add_argument('--http-timeout', type=float, default=DEFAULT_HTTP_TIMEOUT,
+                        help=f'Timeout in seconds for each Spoolman API call (default: {DEFAULT_HTTP_TIMEOUT:g})')
+    parser.add_argument('--http-pool-size', type=int, default=DEFAULT_HTTP_POOL_SIZE,
+                        help=f'Maximum number of pooled Spoolman connections (default: {DEFAULT_HTTP_POOL_SIZE})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Create spools with up to N concurrent requests (default: 1, sequential)')
+    parser.add_argument('--write-retries', type=int, default=DEFAULT_WRITE_RETRIES,
+                        help='Retry Spoolman writes failing with timeouts or 429/5xx errors up to N times '
+                             '(default: %(default)s)')
+    parser.add_argument('--vendor-db', default=str(DEFAULT_COMPILED_DB_PATH),
+                        help='Compiled vendor database to load when present and up to date (default: %(default)s)')
+    parser.add_argument('--catalog', help='Query vendor and color data from this SQLite catalog instead of JSON')
+    parser.add_argument('--cache-dir', default=os.getenv('SPOOLMAN_IMPORTER_CACHE_DIR', str(DEFAULT_CACHE_DIR)),
+                        help='Directory for on-disk caches. Defaults to SPOOLMAN_IMPORTER_CACHE_DIR env var '
+                             f'or {DEFAULT_CACHE_DIR}')
+    parser.add_argument('--llm-cache-size', type=float, default=DEFAULT_CACHE_MAX_BYTES / (1024 * 1024),
+                        help='Maximum size of the LLM result cache in MB (default: %(default)g)')
+    parser.add_argument('--no-llm-cache', action='store_true', help='Always call the LLM, bypassing the cache')
+    parser.add_argument('--clear-llm-cache', action='store_true', help='Delete cached LLM results before running')
+    parser.add_argument('--no-pdf-cache', action='store_true', help='Always re-parse PDFs, bypassing the text cache')
+    parser.add_argument('--clear-pdf-cache', action='store_true', help='Delete cached PDF text before running')
+    parser.add_argument('--llm-backend', choices=sorted(EXTRACTION_BACKENDS), default=OpenAIBackend.name,
+                        help='Receipt extraction backend: OpenAI, an OpenAI-compatible local server, '
+                             'or offline pattern rules (default: %(default)s)')
+    parser.add_argument('--llm-model', default=os.getenv('LLM_MODEL'),
+                        help=f'Model name for the extraction backend. Defaults to LLM_MODEL env var or {LLM_MODEL}')
+    parser.add_argument('--llm-base-url', default=os.getenv('LLM_BASE_URL'),
+                        help='Base URL of the OpenAI-compatible server for --llm-backend local, '
+                             'e.g. http://localhost:11434/v1. Defaults to LLM_BASE_URL env var')
+    parser.add_argument('--llm-timeout', type=float, default=DEFAULT_LLM_TIMEOUT,
+                        help=f'Timeout in seconds for each extraction request (default: {DEFAULT_LLM_TIMEOUT:g})')
+    parser.add_argument('--llm-concurrency', type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help='Extract up to N chunks of a long receipt concurrently (default: %(default)s)')
+    parser.add_argument('--mirror', action='store_true',
+                        help='Keep a local snapshot of Spoolman vendors, filaments and spools in the cache '
+                             'directory and sync it incrementally instead of downloading everything each run')
+    parser.add_argument('--refresh-mirror', action='store_true',
+                        help='Download the local Spoolman snapshot in full before running (implies --mirror)')
+    parser.add_argument('--filtered-lookups', action='store_true',
+                        help='Query Spoolman only for the vendors, filaments and spools on the receipt instead of '
+                             'downloading whole collections (falls back to full lists if filters are unsupported)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip receipt lines the import journal records as already imported, '
+                             'without checking them against Spoolman')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Do not record imported spools in the import journal')
+    parser.add_argument('--timings', nargs='?', const='table', choices=['table', 'json'],
+                        help='Report per-stage and per-endpoint counts, totals and p50/p95/p99 latencies '
+                             'at the end of the run, as a table (default) or JSON')
+    parser.add_argument('--timings-file', help='Write the --timings report to this file instead of stdout')
+    parser.add_argument('--pdf-workers', type=int, default=1,
+                        help='In batch mode, extract PDF text in N worker processes (default: 1, in-process)')
 
     args = parser.parse_args()
     
     # ... (rest of the function)
 
 
+    if args.compile_db:
+        sys.exit(0 if compile_database(Path(args.compile_db)) else 1)
+    if args.build_catalog:
+        sys.exit(0 if build_catalog(Path(args.build_catalog)) else 1)
+    journal_path = Path(args.cache_dir) / 'import-journal.jsonl'
+    if args.compact_journal:
+        before, after = ImportJournal(journal_path).compact()
+        print(f"Compacted import journal {journal_path}: {before} -> {after} entries")
+        sys.exit(0)
+    if args.llm_backend == OpenAICompatibleBackend.name and not args.llm_base_url:
+        print("Error: --llm-backend local requires --llm-base-url or LLM_BASE_URL")
+        sys.exit(1)
+    if args.catalog and not Path(args.catalog).exists():
+        print(f"Error: Catalog not found: {args.catalog}")
+        sys.exit(1)
+
     # Check file existence
     if args.pdf and not Path(args.pdf).exists():
         print(f"Error: PDF file not found: {args.pdf}")
@@ -687,14 +2649,54 @@ def main():
         print(f"Error: JSON file not found: {args.json}")
         sys.exit(1)
 
-    importer = SpoolmanImporter(args.spoolman_url, args.openai_key)
+    receipt_paths = []
+    if args.batch:
+        receipt_paths = find_receipts(args.batch)
+        if not receipt_paths:
+            print(f"Error: No PDF or JSON receipts found for: {args.batch}")
+            sys.exit(1)
+
+    llm_cache = DiskCache(Path(args.cache_dir) / 'llm', max_bytes=int(args.llm_cache_size * 1024 * 1024))
+    if args.clear_llm_cache:
+        llm_cache.clear()
+        print("Cleared LLM result cache")
+    pdf_cache = DiskCache(Path(args.cache_dir) / 'pdf')
+    if args.clear_pdf_cache:
+        pdf_cache.clear()
+        print("Cleared PDF text cache")
+
+    mirror = None
+    if args.mirror or args.refresh_mirror:
+        mirror = SpoolmanMirror(Path(args.cache_dir) / 'spoolman-mirror.sqlite', args.spoolman_url.rstrip('/'))
+        if args.refresh_mirror:
+            mirror.clear()
+
+    importer = SpoolmanImporter(args.spoolman_url, args.openai_key,
+                                http_timeout=args.http_timeout, http_pool_size=args.http_pool_size,
+                                workers=args.workers, llm_cache=None if args.no_llm_cache else llm_cache,
+                                pdf_cache=None if args.no_pdf_cache else pdf_cache,
+                                compiled_db=Path(args.vendor_db),
+                                extraction_backend=make_extraction_backend(
+                                    args.llm_backend, api_key=args.openai_key, model=args.llm_model,
+                                    base_url=args.llm_base_url, timeout=args.llm_timeout,
+                                    concurrency=args.llm_concurrency),
+                                mirror=mirror, filtered_lookups=args.filtered_lookups,
+                                write_retries=args.write_retries,
+                                journal=None if args.no_journal or args.dry_run else ImportJournal(journal_path),
+                                resume=args.resume, timings=Timings() if args.timings else None,
+                                catalog=VendorCatalog(Path(args.catalog)) if args.catalog else None)
 
     try:
+        if receipt_paths:
+            results = importer.process_batch(receipt_paths, vendor_name=args.vendor, dry_run=args.dry_run,
+                                             pdf_workers=args.pdf_workers)
+            sys.exit(0 if all(results.values()) else 1)
         success = importer.process_receipt(
             pdf_path=args.pdf,
             json_path=args.json,
             vendor_name=args.vendor,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            stream=args.stream
         )
         sys.exit(0 if success else 1)
     except KeyboardInterrupt:
@@ -703,6 +2705,14 @@ def main():
     except Exception as e:
         print(f"Unexpected error: {e}")
         sys.exit(1)
+    finally:
+        importer.api.close()
+        if mirror:
+            mirror.close()
+        if importer.journal:
+            importer.journal.close()
+        if importer.timings:
+            report_timings(importer.timings, args.timings, args.timings_file)
 
 
 if __name__ == "__main__":
@@ -1,10 +1,44 @@
 
+import asyncio
+import json
+import os
+import subprocess
+import time
 import unittest
 from unittest.mock import patch, MagicMock
+import requests
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
-from src.spoolman_importer import SpoolmanImporter
+import tempfile
+import threading
+from src.spoolman_importer import (IMPORT_ID_PATTERN, AdaptiveConcurrencyLimiter, AsyncSpoolmanImporter, DiskCache,
+                                  ExtractionBackend, ImportJournal, SpoolmanImporter, Timings, SpoolmanMirror,
+                                  VendorCatalog, OpenAIBackend, compile_database, find_receipts, load_compiled_database,
+                                  make_extraction_backend, split_receipt_text)
+
+def make_pdf(text):
+    """Build a minimal single-page PDF containing the given text."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
 
 class TestSpoolmanImporter(unittest.TestCase):
 
@@ -53,7 +87,7 @@ class TestSpoolmanImporter(unittest.TestCase):
         self.assertEqual(filaments[0]['brand'], 'TestVendor')
         self.assertEqual(filaments[0]['material'], 'PLA')
 
-    @patch('src.spoolman_importer.PdfReader')
+    @patch('pypdf.PdfReader')
     def test_extract_text_from_pdf(self, mock_pdf_reader):
         mock_page = MagicMock()
         mock_page.extract_text.return_value = "Sample PDF text"
@@ -78,8 +112,8 @@ class TestSpoolmanImporter(unittest.TestCase):
         self.assertIsNone(self.importer.get_color_hex("Chartreuse", interactive=False))
 
     @patch('src.spoolman_importer.SpoolmanImporter.get_or_create_vendor', return_value=1)
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
     def test_import_filament_with_temperatures(self, mock_get, mock_post, mock_get_or_create_vendor):
         # Mock API responses
         mock_get.return_value = MagicMock(
@@ -99,7 +133,7 @@ class TestSpoolmanImporter(unittest.TestCase):
             "spool_weight": 200
         }
 
-        self.importer.import_filament(filament_data, 1, [], 'dummy.json', interactive=False)
+        self.importer.import_filament(filament_data, 1, {}, 'dummy.json', interactive=False)
 
         # Check the call to create the filament
         filament_creation_call = mock_post.call_args_list[0]
@@ -109,14 +143,14 @@ class TestSpoolmanImporter(unittest.TestCase):
         self.assertEqual(sent_json['settings_bed_temp'], 65)
 
     @patch('src.spoolman_importer.SpoolmanImporter.get_or_create_vendor', return_value=1)
-    @patch('requests.post')
-    @patch('requests.get')
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
     def test_reimport_skips_duplicate_spools(self, mock_get, mock_post, mock_get_or_create_vendor):
         # Mock API responses
         mock_get.side_effect = [
             # 1. Get existing filaments
             MagicMock(json=lambda: [{'id': 101, 'name': 'PLA Red', 'vendor': {'id': 1, 'name': 'TestVendor'}}]),
-            # 2. Get existing spools for the filament
+            # 2. Get all existing spools
             MagicMock(json=lambda: [{'id': 201, 'comment': 'ImportID: [imported_from:dummy.json|item:TestVendor-PLA-Red-0.0|index:0]'}])
         ]
         
@@ -127,5 +161,786 @@ class TestSpoolmanImporter(unittest.TestCase):
             # Verify that no new spools were created
             mock_post.assert_not_called()
 
+    @patch('requests.Session.get')
+    def test_api_calls_share_session_with_timeout(self, mock_get):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        importer = SpoolmanImporter('http://localhost:7912/', http_timeout=5, http_pool_size=4)
+
+        importer.get_filaments()
+        importer.get_vendors()
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args_list[0].args[0], 'http://localhost:7912/api/v1/filament')
+        for call in mock_get.call_args_list:
+            self.assertEqual(call.kwargs['timeout'], 5)
+        adapter = importer.api.session.get_adapter('http://localhost:7912')
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_vendor_list_fetched_once_per_run(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [{'id': 1, 'name': 'TestVendor'}])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 2, 'name': 'NewVendor'})
+
+        self.assertEqual(self.importer.get_or_create_vendor('testvendor'), 1)
+        self.assertEqual(self.importer.get_or_create_vendor('NewVendor'), 2)
+        self.assertEqual(self.importer.get_or_create_vendor('NEWVENDOR'), 2)
+        self.assertEqual(self.importer.get_or_create_vendor('TESTVENDOR'), 1)
+
+        mock_get.assert_called_once()
+        mock_post.assert_called_once()
+
+    def test_find_existing_filament_uses_index(self):
+        filament_index = self.importer.index_filaments([
+            {'id': 101, 'name': 'PLA Red', 'vendor': {'id': 1, 'name': 'TestVendor'}},
+            {'id': 102, 'name': 'PLA Red', 'vendor': {'id': 2, 'name': 'OtherVendor'}},
+            {'id': 103, 'name': 'PETG Blue', 'vendor': None},
+        ])
+        found = self.importer.find_existing_filament({'material': 'pla', 'color': 'RED'}, 2, filament_index)
+        self.assertEqual(found['id'], 102)
+        self.assertIsNone(self.importer.find_existing_filament({'material': 'PLA', 'color': 'Red'}, 3, filament_index))
+
+    @patch('requests.Session.get')
+    def test_import_id_index_parses_spool_comments(self, mock_get):
+        mock_get.return_value = MagicMock(json=lambda: [
+            {'id': 1, 'comment': 'Imported on 2025-01-01 | ImportID: [imported_from:a.json|item:X-PLA-Red-1.0|index:0]'},
+            {'id': 2, 'comment': None},
+            {'id': 3},
+        ])
+        import_ids = self.importer.get_import_id_index()
+        self.assertEqual(import_ids, {'imported_from:a.json|item:X-PLA-Red-1.0|index:0'})
+        self.importer.get_import_id_index()
+        mock_get.assert_called_once()
+
+    def test_import_id_pattern_allows_brackets_in_id(self):
+        filament_data = {'brand': 'X', 'material': 'PLA', 'color': 'Red [Matte]', 'price': 1.0}
+        import_id = self.importer._generate_import_id('order[2].pdf', filament_data, 0)
+        comment = self.importer.build_comment({'vendor_description': 'Matte [limited]'}, import_id=import_id)
+        self.assertEqual(IMPORT_ID_PATTERN.findall(comment), [import_id])
+        self.assertEqual(IMPORT_ID_PATTERN.findall(comment + " (shelf B)"), [import_id])
+
+    @patch('requests.Session.post')
+    def test_concurrent_spool_creation_skips_duplicates(self, mock_post):
+        mock_post.return_value = MagicMock(json=lambda: {'id': 300})
+        filament_data = {"brand": "TestVendor", "material": "PLA", "color": "Red",
+                         "weight": 1000, "price": 20.0, "quantity": 5}
+        self.importer.workers = 3
+        self.importer._import_ids = {self.importer._generate_import_id('r.json', filament_data, 1)}
+        filament_index = {(1, 'pla red'): {'id': 101, 'name': 'PLA Red'}}
+
+        self.assertTrue(self.importer.import_filament(filament_data, 1, filament_index, 'r.json', interactive=False))
+
+        self.assertEqual(mock_post.call_count, 4)
+        for i in range(5):
+            self.assertIn(self.importer._generate_import_id('r.json', filament_data, i), self.importer._import_ids)
+
+    @patch('requests.Session.post')
+    def test_concurrent_spool_creation_stops_on_failure(self, mock_post):
+        def post(url, **kwargs):
+            response = MagicMock(json=lambda: {'id': 300})
+            if 'index:1]' in kwargs['json']['comment']:
+                error_response = MagicMock(status_code=500, reason='Internal Server Error', text='boom')
+                error_response.json.side_effect = json.JSONDecodeError('Expecting value', 'boom', 0)
+                response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=error_response)
+            return response
+        mock_post.side_effect = post
+        filament_data = {"brand": "TestVendor", "material": "PLA", "color": "Red",
+                         "weight": 1000, "price": 20.0, "quantity": 4}
+        self.importer.workers = 2
+        self.importer.write_retries = 0
+        self.importer._import_ids = set()
+        filament_index = {(1, 'pla red'): {'id': 101, 'name': 'PLA Red'}}
+
+        self.assertFalse(self.importer.import_filament(filament_data, 1, filament_index, 'r.json', interactive=False))
+        self.assertIn(self.importer._generate_import_id('r.json', filament_data, 0), self.importer._import_ids)
+        self.assertNotIn(self.importer._generate_import_id('r.json', filament_data, 1), self.importer._import_ids)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_async_process_receipt_creates_shared_vendor_once(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        created_ids = iter(range(1, 100))
+        mock_post.side_effect = lambda url, **kwargs: MagicMock(json=lambda i=next(created_ids): {'id': i})
+        receipt = '[{"brand": "TestVendor", "material": "PLA", "color": "Red"}, {"brand": "testvendor", "material": "PLA", "color": "Blue"}]'
+
+        with patch('builtins.open', new_callable=unittest.mock.mock_open, read_data=receipt):
+            async_importer = AsyncSpoolmanImporter(self.importer, max_concurrency=2)
+            success = asyncio.run(async_importer.process_receipt(json_path='dummy.json'))
+
+        self.assertTrue(success)
+        urls = [call.args[0] for call in mock_post.call_args_list]
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/vendor'), 1)
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/filament'), 2)
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/spool'), 2)
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_async_process_receipt_validates_llm_lines(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.side_effect = lambda url, **kwargs: MagicMock(json=lambda: {'id': 30, 'name': 'x'})
+        self.importer._vendor_index = {'testvendor': 1}
+        llm_lines = [{"brand": "TestVendor", "material": "PLA", "color": "Red", "price": 20, "quantity": "2"}]
+
+        import_ids = []
+        for run in (lambda: asyncio.run(AsyncSpoolmanImporter(self.importer).process_receipt(pdf_path='r.pdf')),
+                    lambda: self.importer.process_receipt(pdf_path='r.pdf')):
+            mock_post.reset_mock()
+            self.importer._import_ids = set()
+            with patch.object(self.importer, 'load_receipt', return_value=[dict(line) for line in llm_lines]):
+                self.assertTrue(run())
+            comments = [c.kwargs['json']['comment'] for c in mock_post.call_args_list if c.args[0].endswith('/spool')]
+            import_ids.append([IMPORT_ID_PATTERN.findall(c)[0] for c in comments])
+
+        # Both paths create both spools with the same ImportIDs
+        self.assertEqual(len(import_ids[0]), 2)
+        self.assertEqual(import_ids[0], import_ids[1])
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_llm_lines_keep_their_import_ids_on_rerun(self, mock_get, mock_post):
+        llm_line = {"brand": "TestVendor", "material": "PLA", "color": "Red", "price": 20}
+        legacy_id = 'imported_from:r.pdf|item:TestVendor-PLA-Red-20|index:0'
+        spools = [{'id': 201, 'comment': f'ImportID: [{legacy_id}]'}]
+        mock_get.side_effect = lambda url, **kwargs: MagicMock(json=lambda: spools if url.endswith('/spool') else [])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 5, 'name': 'PLA Red'})
+        self.importer._vendor_index = {'testvendor': 1}
+
+        with patch.object(self.importer, 'load_receipt', return_value=[llm_line]):
+            self.assertTrue(self.importer.process_receipt(pdf_path='r.pdf'))
+
+        self.assertEqual([c for c in mock_post.call_args_list if c.args[0].endswith('/spool')], [])
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_batch_fetches_spoolman_state_once(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 7, 'name': 'PLA Red'})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('a.json', 'b.json'):
+                Path(tmp, name).write_text('[{"brand": "TestVendor", "material": "PLA", "color": "Red"}]')
+            Path(tmp, 'notes.txt').write_text('ignored')
+            receipts = find_receipts(tmp)
+            self.assertEqual([p.name for p in receipts], ['a.json', 'b.json'])
+
+            results = self.importer.process_batch(receipts)
+
+        self.assertTrue(all(results.values()))
+        # filaments, vendors and spools are each downloaded once for the whole batch
+        self.assertEqual(mock_get.call_count, 3)
+        urls = [call.args[0] for call in mock_post.call_args_list]
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/filament'), 1)
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/spool'), 2)
+
+    @patch('requests.Session.get')
+    def test_batch_extracts_pdfs_in_process_pool(self, mock_get):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        self.importer.client = None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            Path(tmp, 'a.pdf').write_bytes(make_pdf('PLA Red 19.99 EUR'))
+            Path(tmp, 'b.pdf').write_bytes(make_pdf('PETG Blue 24.50 EUR'))
+            Path(tmp, 'c.json').write_text('[{"brand": "TestVendor", "material": "PLA", "color": "Red"}]')
+            receipts = find_receipts(tmp)
+            with patch.object(self.importer, 'load_receipt', wraps=self.importer.load_receipt) as load_receipt:
+                results = self.importer.process_batch(receipts, dry_run=True, pdf_workers=2)
+
+        self.assertEqual([Path(p).name for p in results], ['a.pdf', 'b.pdf', 'c.json'])
+        self.assertTrue(all(results.values()))
+        texts = {Path(call.args[0] or call.args[1]).name: call.kwargs['receipt_text']
+                 for call in load_receipt.call_args_list}
+        self.assertEqual(texts['a.pdf'].strip(), 'PLA Red 19.99 EUR')
+        self.assertIsNone(texts['c.json'])
+
+    def test_llm_results_are_cached_by_receipt_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.importer.llm_cache = DiskCache(Path(tmp))
+            self.importer.client = MagicMock()
+            self.importer.client.chat.completions.create.return_value.choices = [
+                MagicMock(message=MagicMock(content='[{"brand": "TestVendor", "material": "PLA", "color": "Red"}]'))]
+
+            first = self.importer.extract_filaments_with_llm('receipt text')
+            second = self.importer.extract_filaments_with_llm('receipt text')
+            self.importer.extract_filaments_with_llm('other receipt text')
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.importer.client.chat.completions.create.call_count, 2)
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DiskCache(Path(tmp), max_bytes=25)
+            cache.set('a', 'x' * 10)
+            cache.set('b', 'y' * 10)
+            os.utime(Path(tmp, 'a.cache'), (1, 1))
+            os.utime(Path(tmp, 'b.cache'), (2, 2))
+            cache.get('a')
+            cache.set('c', 'z' * 10)
+
+            self.assertEqual(cache.get('a'), 'x' * 10)
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c'), 'z' * 10)
+            cache.clear()
+            self.assertIsNone(cache.get('a'))
+
+    def test_pdf_text_cache_skips_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = Path(tmp, 'receipt.pdf')
+            pdf_path.write_bytes(make_pdf('PLA Red 19.99 EUR'))
+            self.importer.pdf_cache = DiskCache(Path(tmp, 'cache'))
+
+            first = self.importer.extract_text_from_pdf(str(pdf_path))
+            with patch('pypdf.PdfReader') as mock_pdf_reader:
+                second = self.importer.extract_text_from_pdf(str(pdf_path))
+                mock_pdf_reader.assert_not_called()
+
+                pdf_path.write_bytes(make_pdf('PETG Blue 24.50 EUR'))
+                os.utime(pdf_path, (1, 1))
+                mock_pdf_reader.return_value.pages = [MagicMock(extract_text=lambda: 'changed')]
+                third = self.importer.extract_text_from_pdf(str(pdf_path))
+
+        self.assertEqual(first.strip(), 'PLA Red 19.99 EUR')
+        self.assertEqual(first, second)
+        self.assertEqual(third.strip(), 'changed')
+
+    def test_vendor_lookup_prefers_exact_material_and_returns_copies(self):
+        self.importer.vendor_data = {
+            "vendors": {
+                "Acme": {"PLA Basic": {"spool_weight": 1}, "PLA": {"spool_weight": 2}},
+                "ACME": {"PETG HF": {"spool_weight": 3}},
+            },
+            "material_defaults": {"PLA": {"density": 1.24}, "PETG": {"density": 1.27}},
+        }
+        self.assertEqual(self.importer.get_vendor_filament_data(" acme ", "pla", interactive=False),
+                         {"spool_weight": 2, "density": 1.24})
+        self.assertEqual(self.importer.get_vendor_filament_data("Acme", "basic", interactive=False)["spool_weight"], 1)
+        # Later vendors with the same case-insensitive name are still searched
+        self.assertEqual(self.importer.get_vendor_filament_data("acme", "petg", interactive=False),
+                         {"spool_weight": 3, "density": 1.27})
+
+        first = self.importer.get_vendor_filament_data("Acme", "PLA", interactive=False)
+        first["spool_weight"] = 999
+        self.assertEqual(self.importer.get_vendor_filament_data("Acme", "PLA", interactive=False)["spool_weight"], 2)
+
+    def test_color_matcher_prefers_longest_keyword_and_recompiles(self):
+        self.importer.color_data = {"colors": {"blue": "#0000FF", "galaxy-black": "#2E2E2E", "black": "#000000"}}
+        self.assertEqual(self.importer.get_color_hex("Blue Galaxy Black", interactive=False), "#2E2E2E")
+        self.assertEqual(self.importer.get_color_hex("Blue Black", interactive=False), "#000000")
+
+        self.importer.color_data = {"colors": {"black-blue": "#111133"}}
+        self.assertEqual(self.importer.get_color_hex("Black Blue", interactive=False), "#111133")
+        self.importer.color_data = {"colors": {}}
+        self.assertIsNone(self.importer.get_color_hex("Black", interactive=False))
+
+    def test_extract_base_material_uses_vendor_data_families_and_aliases(self):
+        self.importer.vendor_data = {
+            "vendors": {},
+            "material_defaults": {"PLA": {}, "PA": {}, "PC": {}},
+            "material_aliases": {"Nylon": "PA"},
+        }
+        self.assertEqual(self.importer.extract_base_material("PA6-GF"), "PA")
+        self.assertEqual(self.importer.extract_base_material("nylon cf"), "PA")
+        self.assertEqual(self.importer.extract_base_material("PC Blend"), "PC")
+        # Built-in families keep their priority over families added by vendor data
+        self.assertEqual(self.importer.extract_base_material("Sparkle PLA"), "PLA")
+        self.assertEqual(self.importer.extract_base_material("Silk PLA"), "PLA")
+        self.assertEqual(self.importer.extract_base_material("PVA"), "PLA")
+        # Families from vendor data only match as words of their own
+        self.assertEqual(self.importer.extract_base_material("PA12-CF"), "PA")
+        for material in ("SPARKLE", "Space Gray", "PCTG"):
+            with patch('builtins.print') as mock_print:
+                self.assertEqual(self.importer.extract_base_material(material), "PLA")
+            self.assertIn("Unknown material", mock_print.call_args.args[0])
+
+    def test_compiled_database_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            vendor_path, color_path, db_path = Path(tmp, 'v.json'), Path(tmp, 'c.json'), Path(tmp, 'db.pickle')
+            vendor_path.write_text(json.dumps(self.importer.vendor_data))
+            color_path.write_text('{"colors": {"red": "#FF0000"}}')
+            os.utime(vendor_path, (1, 1))
+            os.utime(color_path, (1, 1))
+
+            self.assertTrue(compile_database(db_path, vendor_path, color_path))
+            database = load_compiled_database(db_path, (vendor_path, color_path))
+            self.assertEqual(database['vendor_data'], self.importer.vendor_data)
+
+            with patch('src.spoolman_importer.load_compiled_database', return_value=database), \
+                    patch.object(SpoolmanImporter, 'load_vendor_data') as load_vendor_data:
+                importer = SpoolmanImporter('http://localhost:7912', compiled_db=db_path)
+                load_vendor_data.assert_not_called()
+            self.assertEqual(importer.get_color_hex('Dark Red', interactive=False), '#FF0000')
+            self.assertEqual(importer.get_vendor_filament_data('testvendor', 'pla', interactive=False)['spool_weight'], 200)
+
+            # Editing the JSON sources makes the compiled database stale
+            os.utime(vendor_path, (time.time() + 10, time.time() + 10))
+            self.assertIsNone(load_compiled_database(db_path, (vendor_path, color_path)))
+
+    def test_compile_database_rejects_invalid_vendor_data(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            vendor_path, color_path, db_path = Path(tmp, 'v.json'), Path(tmp, 'c.json'), Path(tmp, 'db.pickle')
+            vendor_path.write_text('{"vendors": {"X": {"PLA": {"bed_temp": "hot"}}}, "material_defaults": {"PLA": {}}}')
+            color_path.write_text('{"colors": {}}')
+            self.assertFalse(compile_database(db_path, vendor_path, color_path))
+            self.assertFalse(db_path.exists())
+
+    def test_sqlite_catalog_matches_in_memory_lookups(self):
+        vendor_data = {
+            "vendors": {"Acme": {"PLA Basic": {"spool_weight": 1}, "PLA": {"spool_weight": 2}},
+                        "ACME": {"PETG HF": {"spool_weight": 3}}},
+            "material_defaults": {"PLA": {"density": 1.24}, "PETG": {"density": 1.27}},
+            "material_aliases": {"NYLON": "PA"},
+        }
+        color_data = {"colors": {"black": "#000000", "galaxy-black": "#2E2E2E"}}
+        self.importer.vendor_data = vendor_data
+        self.importer.color_data = color_data
+
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog = VendorCatalog.build(Path(tmp, 'catalog.sqlite'), vendor_data, color_data)
+            importer = SpoolmanImporter('http://localhost:7912', catalog=catalog)
+            for brand, material in [("acme", "PLA"), ("Acme", "basic"), ("ACME", "petg"), ("Acme", "hf"),
+                                    ("Other", "PLA")]:
+                self.assertEqual(importer.get_vendor_filament_data(brand, material, interactive=False),
+                                 self.importer.get_vendor_filament_data(brand, material, interactive=False))
+            self.assertEqual(importer.get_color_hex("Galaxy Black", interactive=False), "#2E2E2E")
+            self.assertEqual(importer.get_color_hex("Matte Black", interactive=False), "#000000")
+            self.assertIsNone(importer.get_color_hex("Chartreuse", interactive=False))
+            self.assertEqual(importer.extract_base_material("Nylon"), "PA")
+            self.assertEqual(importer.vendor_data["vendors"], {})
+            catalog.close()
+
+    def test_startup_does_not_import_pdf_or_llm_libraries(self):
+        # Guards CLI startup time: JSON imports must not pay for importing pypdf, openai or asyncio
+        script = (
+            "import sys; sys.path.insert(0, 'src'); import spoolman_importer as m; "
+            "m.SpoolmanImporter('http://localhost:7912', 'fake_api_key'); "
+            "print(sorted(name for name in ('asyncio', 'openai', 'pypdf') if name in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=Path(__file__).parent.parent, check=True)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
+
+    @patch('openai.OpenAI')
+    def test_client_set_to_none_stays_disabled(self, mock_openai):
+        self.importer.client = None
+        self.assertIsNone(self.importer.client)
+        self.assertFalse(self.importer.backend.available)
+        mock_openai.assert_not_called()
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_process_receipt_uses_vendor_argument_for_null_brand(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 5, 'name': 'x'})
+        self.importer._vendor_index = {'testvendor': 7}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = Path(tmp, 'receipt.json')
+            json_path.write_text('[{"brand": null, "material": "PLA", "color": "Red"}]')
+            self.assertTrue(self.importer.process_receipt(json_path=str(json_path), vendor_name='TestVendor'))
+
+        payloads = {call.args[0]: call.kwargs['json'] for call in mock_post.call_args_list}
+        self.assertNotIn('http://localhost:7912/api/v1/vendor', payloads)
+        self.assertEqual(payloads['http://localhost:7912/api/v1/filament']['vendor_id'], 7)
+
+    def test_iter_filaments_from_json_streams_arrays_and_ndjson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            array_path = Path(tmp, 'manifest.json')
+            array_path.write_text(json.dumps([{"brand": f"V{i}", "price": i} for i in range(50)]))
+            ndjson_path = Path(tmp, 'manifest.ndjson')
+            ndjson_path.write_text('{"brand": "A"}\n"not a filament"\n{"brand": "B", "price": "abc"}\n{"brand": "C"}\n')
+
+            with patch('src.spoolman_importer.JSON_STREAM_CHUNK_SIZE', 16):
+                streamed = self.importer.iter_filaments_from_json(str(array_path))
+                self.assertEqual(next(streamed)['brand'], 'V0')
+                self.assertEqual([f['price'] for f in streamed], [float(i) for i in range(1, 50)])
+            self.assertEqual([f['brand'] for f in self.importer.iter_filaments_from_json(str(ndjson_path))], ['A', 'C'])
+
+            wrapped_path = Path(tmp, 'wrapped.json')
+            wrapped_path.write_text('{"items": [{"brand": "A"}]}')
+            with self.assertRaises(ValueError):
+                list(self.importer.iter_filaments_from_json(str(wrapped_path)))
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_truncated_stream_fails_the_receipt(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 5, 'name': 'x'})
+        self.importer._vendor_index = {'testvendor': 1}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ndjson_path = Path(tmp, 'manifest.ndjson')
+            ndjson_path.write_text('{"brand": "TestVendor", "color": "Red"}\n{"brand": "TestVendor", "color": "Blue"}\n{"brand": "Te')
+            journal_path = Path(tmp, 'journal.jsonl')
+            self.importer.journal = ImportJournal(journal_path)
+            self.assertFalse(self.importer.process_receipt(json_path=str(ndjson_path)))
+            self.importer.journal.close()
+            self.assertNotIn('complete', journal_path.read_text())
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_process_receipt_streams_ndjson_lines(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.return_value = MagicMock(json=lambda: {'id': 5, 'name': 'x'})
+        self.importer._vendor_index = {'testvendor': 1}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ndjson_path = Path(tmp, 'manifest.ndjson')
+            ndjson_path.write_text('{"brand": "TestVendor", "color": "Red"}\n{"brand": "TestVendor", "color": "Blue"}\n')
+            with patch.object(self.importer, 'load_filaments_from_json') as load_filaments:
+                self.assertTrue(self.importer.process_receipt(json_path=str(ndjson_path)))
+                load_filaments.assert_not_called()
+
+        urls = [call.args[0] for call in mock_post.call_args_list]
+        self.assertEqual(urls.count('http://localhost:7912/api/v1/spool'), 2)
+
+    def test_pipeline_stages_drop_failed_items(self):
+        context = {'source_filename': 'r.json', 'vendor_name': None, 'filament_index': {}, 'interactive': False,
+                   'total': 0, 'imported': 0}
+        filaments = [{"brand": "TestVendor", "color": "Red"}, "bad", {"brand": "TestVendor", "color": None},
+                     {"brand": "TestVendor", "color": "Blue", "price": None}]
+        with patch.object(self.importer, 'get_or_create_vendor', return_value=1), \
+                patch.object(self.importer, 'upsert_filament', side_effect=[7, None, 8]) as upsert, \
+                patch.object(self.importer, 'create_spools', return_value=True) as create_spools:
+            stages = [self.importer.stage_validate] + self.importer.import_stages()
+            self.importer.run_pipeline(iter(filaments), stages, context)
+
+        self.assertEqual((context['total'], context['imported']), (4, 2))
+        self.assertEqual(upsert.call_args_list[1].args[0]['color'], 'Unknown')
+        self.assertEqual([call.args[1] for call in create_spools.call_args_list], [7, 8])
+
+    def test_split_receipt_text_breaks_at_line_items(self):
+        items = [f"Filament PLA Color {i}\n1kg spool 1.75mm  19.99 EUR\n" for i in range(20)]
+        text = "Order 1234\n" + "".join(items)
+        chunks = split_receipt_text(text, max_chars=200)
+
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(len(chunk) <= 200 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith("EUR\n") for chunk in chunks))
+        self.assertEqual(split_receipt_text("short receipt", max_chars=200), ["short receipt"])
+
+    def test_llm_extracts_long_receipts_in_concurrent_chunks(self):
+        in_flight, peak, lock = [0], [0], threading.Lock()
+
+        def complete(model, messages, temperature):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            colors = [line.split()[-1] for line in messages[1]['content'].splitlines() if line.startswith('PLA ')]
+            items = [{"brand": "TestVendor", "material": "PLA", "color": color} for color in colors]
+            items.append({"brand": "TestVendor", "material": "PLA", "color": "Summary"})
+            return MagicMock(choices=[MagicMock(message=MagicMock(content=json.dumps(items)))])
+
+        self.importer.client = MagicMock()
+        self.importer.client.chat.completions.create.side_effect = complete
+        self.importer.backend.concurrency = 2
+        text = "".join(f"PLA {i}\nSpool 1kg 19.99 EUR\n\n" for i in range(12))
+
+        with patch('src.spoolman_importer.LLM_CHUNK_MAX_CHARS', 60):
+            filaments = self.importer.extract_filaments_with_llm(text)
+
+        self.assertGreater(self.importer.client.chat.completions.create.call_count, 2)
+        self.assertEqual(peak[0], 2)
+        # The summary item echoed by every chunk is kept once, where it first appeared
+        colors = [f['color'] for f in filaments]
+        self.assertEqual(colors.count('Summary'), 1)
+        self.assertEqual([c for c in colors if c != 'Summary'], [str(i) for i in range(12)])
+
+    def test_failed_llm_chunk_falls_back_or_fails_the_receipt(self):
+        chunks = ["PLA Red 19.99 EUR\n\n", "PETG Blue 24.50 EUR\n\n", "Thank you for your order\n"]
+
+        def extract(chunk):
+            if 'PETG' in chunk or 'Thank' in chunk:
+                return None
+            return [{"brand": "TestVendor", "material": "PLA", "color": "Red"}]
+
+        self.importer.client = MagicMock()
+        with patch('src.spoolman_importer.split_receipt_text', return_value=chunks[:2]), \
+                patch.object(self.importer.backend, 'extract', side_effect=extract) as backend_extract:
+            filaments = self.importer.extract_filaments_with_llm("".join(chunks[:2]))
+        # The failed chunk is retried once, then pattern matching recovers its line item
+        self.assertEqual(backend_extract.call_count, 3)
+        self.assertEqual([f['material'] for f in filaments], ['PLA', 'PETG'])
+        self.assertEqual(filaments[1]['price'], 24.5)
+
+        with patch('src.spoolman_importer.split_receipt_text', return_value=[chunks[0], chunks[2]]), \
+                patch.object(self.importer.backend, 'extract', side_effect=extract):
+            self.assertIsNone(self.importer.extract_filaments_with_llm(chunks[0] + chunks[2]))
+
+    def test_extraction_backends_are_pluggable(self):
+        with self.assertRaises(TypeError):
+            type('IncompleteBackend', (ExtractionBackend,), {})()
+        rules = make_extraction_backend('rules')
+        importer = SpoolmanImporter('http://localhost:7912', extraction_backend=rules)
+        self.assertEqual(importer.extract_filaments_with_llm('Filament PLA Red 19.99 EUR')[0]['price'], 19.99)
+
+        local = make_extraction_backend('local', model='llama3', base_url='http://localhost:11434/v1', timeout=5)
+        with patch('openai.OpenAI') as openai_client:
+            self.assertTrue(local.available)
+        openai_client.assert_called_once_with(api_key='local', base_url='http://localhost:11434/v1', timeout=5)
+        self.assertNotEqual(local.cache_key_parts(), OpenAIBackend('key', model='llama3').cache_key_parts())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            importer.llm_cache = DiskCache(Path(tmp))
+            importer.backend = local
+            local.client.chat.completions.create.return_value.choices = [MagicMock(message=MagicMock(content='[]'))]
+            self.assertEqual(importer.extract_filaments_with_llm('receipt'), [])
+            self.assertEqual(local.client.chat.completions.create.call_args.kwargs['model'], 'llama3')
+
+    def test_mirror_syncs_incrementally(self):
+        server = {'spool': [{'id': i, 'comment': f'ImportID: [s{i}]'} for i in range(1, 8)]}
+        requests_made = []
+
+        def get(path, params=None):
+            records = server[path.rsplit('/', 1)[1]]
+            requests_made.append(params)
+            if params:
+                records = sorted(records, key=lambda r: r['id'], reverse=True)
+                records = records[params['offset']:params['offset'] + params['limit']]
+            return MagicMock(json=lambda: records, headers={'X-Total-Count': str(len(server['spool']))})
+
+        api = MagicMock(get=MagicMock(side_effect=get))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp, 'mirror.sqlite')
+            self.assertEqual(len(SpoolmanMirror(path, 'http://a', page_size=2).sync(api, 'spool')), 7)
+
+            server['spool'] += [{'id': 8}, {'id': 9}, {'id': 10}]
+            requests_made.clear()
+            mirror = SpoolmanMirror(path, 'http://a', page_size=2)
+            self.assertEqual([r['id'] for r in mirror.sync(api, 'spool')], list(range(1, 11)))
+            self.assertEqual([p['offset'] for p in requests_made], [0, 2])
+            mirror.sync(api, 'spool')
+            self.assertEqual(len(requests_made), 2)
+
+            server['spool'] = [r for r in server['spool'] if r['id'] != 3]
+            requests_made.clear()
+            mirror = SpoolmanMirror(path, 'http://a', page_size=2)
+            self.assertNotIn(3, [r['id'] for r in mirror.sync(api, 'spool')])
+            self.assertEqual(requests_made, [{'sort': 'id:desc', 'limit': 2, 'offset': 0}, None])
+
+            self.assertEqual(SpoolmanMirror(path, 'http://b').records('spool'), [])
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_filtered_lookups_query_only_receipt_items(self, mock_get, mock_post):
+        server = {
+            '/api/v1/vendor': [{'id': 1, 'name': 'TestVendor Pro'}, {'id': 2, 'name': 'testvendor'}],
+            '/api/v1/filament': [{'id': 10, 'name': 'PLA Red', 'vendor': {'id': 2}}],
+            '/api/v1/spool': [],
+        }
+
+        def get(url, params=None, **kwargs):
+            path = url.replace('http://localhost:7912', '')
+            if params is None and self.filters_supported is False:
+                return MagicMock(json=lambda: server[path])
+            if not self.filters_supported:
+                response = requests.Response()
+                response.status_code = 422
+                return response
+            return MagicMock(json=lambda: server[path], headers={'X-Total-Count': str(len(server[path]))})
+
+        mock_get.side_effect = get
+        mock_post.return_value = MagicMock(json=lambda: {'id': 20, 'name': 'x'})
+        filament = {'brand': 'TestVendor', 'material': 'PLA', 'color': 'Red', 'weight': 1000, 'diameter': 1.75}
+
+        self.filters_supported = True
+        importer = SpoolmanImporter('http://localhost:7912', filtered_lookups=True)
+        self.assertEqual(importer.get_or_create_vendor('TestVendor'), 2)
+        self.assertEqual(importer.find_existing_filament(filament, 2, importer.get_filament_index())['id'], 10)
+        self.assertTrue(importer.create_spools(filament, 10, 'receipt.json'))
+        self.assertTrue(all(call.kwargs.get('params') for call in mock_get.call_args_list))
+        self.assertEqual(mock_get.call_args_list[0].kwargs['params']['name'], 'TestVendor')
+        self.assertEqual(mock_get.call_args_list[2].kwargs['params']['filament.id'], 10)
+
+        mock_get.reset_mock()
+        self.filters_supported = False
+        importer = SpoolmanImporter('http://localhost:7912', filtered_lookups=True)
+        self.assertEqual(importer.get_or_create_vendor('TestVendor'), 2)
+        self.assertFalse(importer.filtered_lookups)
+        self.assertEqual(importer.find_existing_filament(filament, 2, importer.get_filament_index())['id'], 10)
+
+    @patch('src.spoolman_importer.time.sleep')
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_writes_retry_transient_errors_without_duplicates(self, mock_get, mock_post, mock_sleep):
+        unavailable = MagicMock(status_code=503, headers={'Retry-After': '2'})
+        failed = MagicMock()
+        failed.raise_for_status.side_effect = requests.exceptions.HTTPError(response=unavailable)
+        mock_post.side_effect = [failed, MagicMock(json=lambda: {'id': 7, 'name': 'NewVendor'})]
+        mock_get.return_value = MagicMock(json=lambda: [{'id': 6, 'name': 'NewVendorX'}], headers={})
+
+        self.assertEqual(self.importer.create_vendor('NewVendor'), 7)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertGreaterEqual(mock_sleep.call_args.args[0], 2)
+
+        # The timed-out spool POST was applied, so the recheck finds it instead of posting again
+        import_id = 'imported_from:r.json|item:x|index:0'
+        mock_post.reset_mock()
+        mock_post.side_effect = requests.exceptions.ReadTimeout()
+        mock_get.return_value = MagicMock(json=lambda: [{'id': 9, 'comment': f'ImportID: [{import_id}]'}],
+                                          headers={})
+        filament_data = {"brand": "TestVendor", "material": "PLA", "color": "Red", "weight": 1000}
+        self.assertEqual(self.importer.create_spool(101, filament_data, import_id)['id'], 9)
+        self.assertEqual(mock_post.call_count, 1)
+
+        mock_post.reset_mock()
+        mock_post.side_effect = None
+        mock_post.return_value = failed
+        unavailable.status_code = 400
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.importer.create_spool(101, filament_data, import_id)
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_adaptive_limiter_backs_off_and_recovers(self):
+        limiter = AdaptiveConcurrencyLimiter(8)
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(40):
+            limiter.release(limiter.acquire())
+        self.assertGreater(limiter.limit, 6)
+        self.assertLessEqual(limiter.limit, 8)
+
+        blocked = threading.Event()
+        limiter.limit = 1
+        started = limiter.acquire()
+        worker = threading.Thread(target=lambda: (limiter.acquire(), blocked.set()))
+        worker.start()
+        self.assertFalse(blocked.wait(0.1))
+        limiter.release(started)
+        self.assertTrue(blocked.wait(1))
+        worker.join()
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_resume_skips_journaled_lines(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+
+        def post(url, **kwargs):
+            payload = kwargs['json']
+            if url.endswith('/spool') and 'Blue' in payload['comment'] and self.spools_fail:
+                response = MagicMock(status_code=400, reason='Bad Request', text='boom')
+                response.json.side_effect = json.JSONDecodeError('Expecting value', 'boom', 0)
+                failed = MagicMock()
+                failed.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+                return failed
+            return MagicMock(json=lambda: {'id': 30, 'name': payload.get('name')})
+        mock_post.side_effect = post
+
+        with tempfile.TemporaryDirectory() as tmp:
+            receipt = Path(tmp, 'receipt.json')
+            receipt.write_text(json.dumps([
+                {"brand": "TestVendor", "material": "PLA", "color": "Red", "quantity": 2},
+                {"brand": "TestVendor", "material": "PLA", "color": "Blue"},
+            ]))
+            journal_path = Path(tmp, 'journal.jsonl')
+            self.spools_fail = True
+            self.importer.journal = ImportJournal(journal_path)
+            self.importer._vendor_index = {'testvendor': 1}
+            self.importer.process_receipt(json_path=str(receipt))
+            self.importer.journal.close()
+            self.assertEqual(len(journal_path.read_text().splitlines()), 2)
+
+            self.spools_fail = False
+            mock_get.reset_mock()
+            mock_post.reset_mock()
+            importer = SpoolmanImporter('http://localhost:7912', journal=ImportJournal(journal_path), resume=True)
+            importer._vendor_index = {'testvendor': 1}
+            importer.vendor_data = self.importer.vendor_data
+            self.assertTrue(importer.process_receipt(json_path=str(receipt)))
+            importer.journal.close()
+            spool_posts = [c for c in mock_post.call_args_list if c.args[0].endswith('/spool')]
+            self.assertEqual(len(spool_posts), 1)
+            self.assertIn('Blue', spool_posts[0].kwargs['json']['comment'])
+
+            self.assertEqual(ImportJournal(journal_path).compact(), (4, 1))
+            mock_get.reset_mock()
+            mock_post.reset_mock()
+            importer = SpoolmanImporter('http://localhost:7912', journal=ImportJournal(journal_path), resume=True)
+            self.assertTrue(importer.process_receipt(json_path=str(receipt)))
+            importer.journal.close()
+            mock_get.assert_not_called()
+            mock_post.assert_not_called()
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_async_resume_skips_journaled_receipt_without_requests(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.side_effect = lambda url, **kwargs: MagicMock(json=lambda: {'id': 30, 'name': 'x'})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            receipt = Path(tmp, 'receipt.json')
+            receipt.write_text(json.dumps([{"brand": "TestVendor", "color": "Red", "quantity": 2}]))
+            journal_path = Path(tmp, 'journal.jsonl')
+            self.importer.journal = ImportJournal(journal_path)
+            self.importer._vendor_index = {'testvendor': 1}
+            self.assertTrue(asyncio.run(AsyncSpoolmanImporter(self.importer).process_receipt(json_path=str(receipt))))
+            self.importer.journal.close()
+            self.assertTrue(json.loads(journal_path.read_text().splitlines()[-1])['complete'])
+
+            mock_get.reset_mock()
+            mock_post.reset_mock()
+            importer = SpoolmanImporter('http://localhost:7912', journal=ImportJournal(journal_path), resume=True)
+            self.assertTrue(asyncio.run(AsyncSpoolmanImporter(importer).process_receipt(json_path=str(receipt))))
+            importer.journal.close()
+            mock_get.assert_not_called()
+            mock_post.assert_not_called()
+
+    @patch('requests.Session.post')
+    @patch('requests.Session.get')
+    def test_resume_is_scoped_to_receipt_contents_and_server(self, mock_get, mock_post):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        mock_post.side_effect = lambda url, **kwargs: MagicMock(json=lambda: {'id': 30, 'name': 'x'})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            journal_path = Path(tmp, 'journal.jsonl')
+            receipts = {}
+            for month, color in (('jan', 'Red'), ('feb', 'Blue')):
+                receipts[month] = Path(tmp, month, 'invoice.json')
+                receipts[month].parent.mkdir()
+                receipts[month].write_text(json.dumps([{"brand": "TestVendor", "color": color, "quantity": 3}]))
+            self.importer.journal = ImportJournal(journal_path)
+            self.importer._vendor_index = {'testvendor': 1}
+            self.assertTrue(self.importer.process_receipt(json_path=str(receipts['jan'])))
+            self.importer.journal.close()
+
+            for url, receipt in (('http://localhost:7912', receipts['feb']), ('http://other:7912', receipts['jan'])):
+                mock_post.reset_mock()
+                importer = SpoolmanImporter(url, journal=ImportJournal(journal_path), resume=True)
+                importer._vendor_index = {'testvendor': 1}
+                importer.vendor_data = self.importer.vendor_data
+                self.assertTrue(importer.process_receipt(json_path=str(receipt)))
+                importer.journal.close()
+                spool_posts = [c for c in mock_post.call_args_list if c.args[0].endswith('/spool')]
+                self.assertEqual(len(spool_posts), 3)
+
+    def test_compact_without_journal_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            journal_path = Path(tmp, 'missing', 'import-journal.jsonl')
+            self.assertEqual(ImportJournal(journal_path).compact(), (0, 0))
+            self.assertFalse(journal_path.parent.exists())
+
+    def test_timings_summarize_stage_latencies(self):
+        timings = Timings()
+        for ms in range(1, 101):
+            timings.record('stage', ms / 1000)
+        stats = timings.summary()['stage']
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['total'], 5.05)
+        self.assertEqual((stats['p50'], stats['p95'], stats['p99']), (0.05, 0.095, 0.099))
+        self.assertIn('stage', timings.format_table().splitlines()[1])
+
+    @patch('requests.Session.get')
+    def test_timings_record_http_calls_and_stages(self, mock_get):
+        mock_get.return_value = MagicMock(json=lambda: [])
+        self.importer.timings = self.importer.api.timings = Timings()
+        self.importer.get_vendors()
+        self.importer.get_color_hex('Red', interactive=False)
+        self.importer.get_vendor_filament_data('TestVendor', 'PLA', interactive=False)
+
+        summary = self.importer.timings.summary()
+        self.assertEqual(set(summary), {'http GET /api/v1/vendor', 'get_color_hex', 'get_vendor_filament_data'})
+        self.assertTrue(all(stats['count'] == 1 for stats in summary.values()))
+
 if __name__ == '__main__':
     unittest.main()